@@ -0,0 +1,109 @@
+'''
+adaptive refinement of the scaled x axis of an experiment series
+'''
+
+
+import math
+import logging as log
+import numpy as np
+
+
+def coarse_grid(candidates, points):
+    # evenly spread over the candidates, always including both ends
+    if points >= len(candidates):
+        return list(candidates)
+    indices = sorted(set(round(i * (len(candidates) - 1) / (points - 1)) for i in range(points)))
+    return [candidates[i] for i in indices]
+
+
+def model_bounds(candidates, points, model_start, model_end):
+    # model_start/model_end count excluded points of the full candidate list
+    excluded_start = set(candidates[:model_start])
+    excluded_end = set(candidates[len(candidates) - model_end:]) if model_end else set()
+    return len([p for p in points if p in excluded_start]), len([p for p in points if p in excluded_end])
+
+
+def _segment_error(x, y):
+    if len(x) < 3:
+        return 0.0
+    A = np.vstack([x, np.ones(len(x))]).T
+    coefficients, _, _, _ = np.linalg.lstsq(A, y, rcond=None)
+    return float(np.sum((A.dot(coefficients) - y) ** 2))
+
+
+def fit_piecewise(x, y, max_parts):
+    '''
+    least squares fit of up to max_parts linear segments (at least two points
+    each), returns the index ranges of the segments and the fitted values
+    '''
+    n = len(x)
+    max_parts = max(1, min(max_parts, n // 2))
+    error = [[_segment_error(x[i:j], y[i:j]) if j - i >= 2 else math.inf for j in range(n + 1)]
+             for i in range(n)]
+
+    # best[k][j]: error of the first j points in k segments
+    best = [[math.inf] * (n + 1) for _ in range(max_parts + 1)]
+    split = [[0] * (n + 1) for _ in range(max_parts + 1)]
+    best[0][0] = 0.0
+    for k in range(1, max_parts + 1):
+        for j in range(2, n + 1):
+            for i in range(0, j - 1):
+                value = best[k - 1][i] + error[i][j]
+                if value < best[k][j]:
+                    best[k][j] = value
+                    split[k][j] = i
+
+    # fewest segments that are (almost) as good as the best fit
+    target = best[max_parts][n] * 1.05 + 1e-12
+    parts = min(k for k in range(1, max_parts + 1) if best[k][n] <= target)
+    segments = []
+    j = n
+    for k in range(parts, 0, -1):
+        i = split[k][j]
+        segments.insert(0, (i, j))
+        j = i
+
+    fitted = np.zeros(n)
+    for i, j in segments:
+        A = np.vstack([x[i:j], np.ones(j - i)]).T
+        coefficients, _, _, _ = np.linalg.lstsq(A, y[i:j], rcond=None)
+        fitted[i:j] = A.dot(coefficients)
+    return segments, fitted
+
+
+def refine(candidates, measured, max_parts, log_scale=False, tolerance=0.02):
+    '''
+    returns the candidates to measure next, given the measured values per x
+
+    A new point is added in the middle of the candidates between two
+    neighbouring measured points if the piecewise model bends between them or
+    if the model misses one of them by more than the relative tolerance.
+    '''
+    xs = sorted(x for x in measured if x in candidates)
+    if len(xs) < 2:
+        return []
+    x = np.array([math.log10(v) if log_scale and v > 0 else v for v in xs], dtype=float)
+    y = np.array([measured[v] for v in xs], dtype=float)
+    segments, fitted = fit_piecewise(x, y, max_parts)
+
+    intervals = set()
+    # bends of the model
+    for i, _ in segments[1:]:
+        intervals.add(i - 1)
+    # points not explained by the model
+    scale = max(np.max(np.abs(y)), 1e-12)
+    for i, (value, model) in enumerate(zip(y, fitted)):
+        if abs(value - model) / max(abs(value), scale * 1e-3) > tolerance:
+            if i > 0:
+                intervals.add(i - 1)
+            if i < len(xs) - 1:
+                intervals.add(i)
+
+    new = []
+    for i in sorted(intervals):
+        low = candidates.index(xs[i])
+        high = candidates.index(xs[i + 1])
+        if high - low > 1:
+            new.append(candidates[(low + high) // 2])
+    log.info('Model with %d parts, %d new points', len(segments), len(new))
+    return new
@@ -0,0 +1,130 @@
+'''
+content-addressed cache for generated P4 data and control planes
+'''
+
+
+import os
+import fcntl
+import shutil
+import hashlib
+import subprocess
+import threading
+import logging as log
+
+
+# ioctl cloning a file on copy-on-write filesystems
+FICLONE = 0x40049409
+# files written by p4gen16, the others in its output directory are rendered by the framework
+PLANES = [
+    'program.p4',
+    'controller',
+    'controlplane.c.py',
+]
+
+
+def p4gen16_revision(path):
+    # commit of the p4gen16 checkout, local modifications invalidate the cache as well
+    try:
+        commit = subprocess.run(['git', '-C', path, 'rev-parse', 'HEAD'],
+                                check=True, capture_output=True).stdout
+        diff = subprocess.run(['git', '-C', path, 'diff', 'HEAD'],
+                              check=True, capture_output=True).stdout
+        return hashlib.sha256(commit + diff).hexdigest()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        log.warning('p4gen16 is not a git checkout, hashing its sources instead')
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if d not in ['.git', '__pycache__'])
+        for name in sorted(files):
+            filename = os.path.join(root, name)
+            digest.update(os.path.relpath(filename, path).encode())
+            with open(filename, 'rb') as fh:
+                digest.update(fh.read())
+    return digest.hexdigest()
+
+
+def _entry_size(entry):
+    return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+
+def _reflink_or_copy(src, dst):
+    # never a hardlink, writes into the experiment must not change the cache and vice versa
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class PlaneCache:
+    '''
+    generated planes stored by a hash of the p4gen16 arguments and revision,
+    evicting the least recently used entries once max_size bytes are exceeded
+    '''
+
+    def __init__(self, path, max_size, revision):
+        self.path = path
+        self.max_size = max_size
+        self.revision = revision
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def key(self, args):
+        digest = hashlib.sha256(self.revision.encode())
+        for arg in args:
+            digest.update(b'\0' + arg.encode())
+        return digest.hexdigest()
+
+    def restore(self, key, outdir):
+        entry = os.path.join(self.path, key)
+        with self.lock:
+            if not os.path.isdir(entry):
+                self.misses += 1
+                return False
+            for name in os.listdir(entry):
+                if name in PLANES:
+                    _reflink_or_copy(os.path.join(entry, name), os.path.join(outdir, name))
+            # mark as recently used
+            os.utime(entry)
+            self.hits += 1
+        return True
+
+    def store(self, key, outdir):
+        entry = os.path.join(self.path, key)
+        tmp = '{}.tmp-{}-{}'.format(entry, os.getpid(), threading.get_ident())
+        os.makedirs(tmp)
+        for name in PLANES:
+            src = os.path.join(outdir, name)
+            if os.path.isfile(src):
+                _reflink_or_copy(src, os.path.join(tmp, name))
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # stored concurrently by someone else
+            shutil.rmtree(tmp)
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = [os.path.join(self.path, name) for name in os.listdir(self.path) if '.tmp-' not in name]
+            entries.sort(key=os.path.getmtime)
+            sizes = {entry: _entry_size(entry) for entry in entries}
+            total = sum(sizes.values())
+            for entry in entries:
+                if total <= self.max_size:
+                    break
+                log.debug('evicting %s from P4 program cache', os.path.basename(entry))
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= sizes[entry]
+
+    def log_statistics(self):
+        # once per run, the cache may be shared by several experiments
+        with self.lock:
+            lookups = self.hits + self.misses
+            log.info('P4 program cache: %d hits, %d misses (%.0f%% hit rate)',
+                     self.hits, self.misses, 100 * self.hits / lookups if lookups else 0)
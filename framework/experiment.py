@@ -8,13 +8,22 @@ import sys
 import logging as log
 import subprocess
 import pathlib
+import threading
+import fcntl
 import yaml
-import glob
 import shutil
 import json
+from concurrent.futures import ThreadPoolExecutor
 from jinja2 import Environment, select_autoescape, FileSystemLoader
 from string import Template
 
+from framework.p4gen16 import GENERATE
+from framework.manifest import open_manifest, get_manifest, close_manifest
+from framework.table_entries import bulk_file, key_size, table_size
+from framework.planning import swept_packet_sizes
+from framework.topology import order_cores, port_queues, isolation_parameters
+from framework.perf_events import group_events, perf_runs
+
 
 BASEPATH = os.path.join(pathlib.Path(__file__).parent.absolute(), '..')
 TEMPLATES = os.path.join(BASEPATH, 'templates')
@@ -58,20 +67,84 @@ class NotebookTemplate(Template):
 def dump_specification(spec):
     log.info('Dumping specification')
     dumped = yaml.dump(spec)
-    target = os.path.join(spec['meta']['outdir'], 'specification.yml')
-    with open(target, 'w') as outfile:
-        outfile.write(dumped)
+    get_manifest(spec['meta']['outdir']).write('specification.yml', dumped)
 
 
 def generate_loop_variables(spec):
     log.info('Generating loop variables')
-    dumped = yaml.dump(spec['metrics']['scale'])
-    target = os.path.join(spec['meta']['outdir'], DIRS['experiment'], 'loop-variables.yml')
-    with open(target, 'w') as outfile:
-        outfile.write(dumped)
+    # pos nests the loop variables in file order with the first one outermost,
+    # keep all iterations of one P4 program together to avoid recompiling it
+    scale = spec['metrics']['scale']
+    # packet sizes swept in one MoonGen process are no loop variable
+    order = sorted([key for key in scale if not (key == 'packet_size' and swept_packet_sizes(spec))])
+    if spec['program']['scale'] and spec['program']['scale']['with'] in scale:
+        order.remove(spec['program']['scale']['with'])
+        order.insert(0, spec['program']['scale']['with'])
+    dumped = yaml.dump({key: scale[key] for key in order}, sort_keys=False)
+    target = os.path.join(DIRS['experiment'], 'loop-variables.yml')
+    get_manifest(spec['meta']['outdir']).write(target, dumped)
+
+
+# ioctl to create a copy-on-write clone of a file (btrfs, xfs)
+FICLONE = 0x40049409
+
+# per process, whether the filesystem (device of the destination) supports cloning
+_REFLINK_SUPPORT = {}
+
+# shared evaluation directories already populated in this process
+_SHARED_EVALUATION = set()
+_SHARED_EVALUATION_LOCK = threading.Lock()
 
 
-def copy_tree_evaluation(src, dst):
+def _unchanged_copy(src, dst):
+    try:
+        src_stat = os.stat(src)
+        dst_stat = os.lstat(dst)
+    except FileNotFoundError:
+        return False
+    # a hardlink of an earlier generation is replaced by a copy
+    if src_stat.st_ino == dst_stat.st_ino and src_stat.st_dev == dst_stat.st_dev:
+        return False
+    return src_stat.st_size == dst_stat.st_size and int(src_stat.st_mtime) == int(dst_stat.st_mtime)
+
+
+def clone_file(src, dst):
+    if _unchanged_copy(src, dst):
+        return
+    if os.path.lexists(dst):
+        os.remove(dst)
+    # never a hardlink, edits in the experiment must not change deps/plot_scripts
+    device = os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+    if _REFLINK_SUPPORT.get(device, True):
+        try:
+            with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return
+        except OSError:
+            _REFLINK_SUPPORT[device] = False
+            if os.path.lexists(dst):
+                os.remove(dst)
+    shutil.copy2(src, dst)
+
+
+def clone_tree(src, dst):
+    os.makedirs(dst, exist_ok=True)
+    for entry in os.scandir(src):
+        target = os.path.join(dst, entry.name)
+        if entry.name == '__pycache__':
+            continue
+        if entry.is_symlink():
+            if os.path.lexists(target):
+                os.remove(target)
+            os.symlink(os.readlink(entry.path), target)
+        elif entry.is_dir():
+            clone_tree(entry.path, target)
+        else:
+            clone_file(entry.path, target)
+
+
+def _evaluation_entries(src, skip=None):
     blacklist = [
         'sample_data',
         'venv3',
@@ -79,25 +152,61 @@ def copy_tree_evaluation(src, dst):
         'data',
         'build'
     ]
-    if not os.path.exists(dst):
-        os.makedirs(dst)
-    for file in glob.glob(src + '/*', recursive=True) + [src + '/.gitignore']:
-        if any([block in file for block in blacklist]):
+    for entry in sorted(os.scandir(src), key=lambda entry: entry.name):
+        if entry.name.startswith('.') and entry.name != '.gitignore':
+            continue
+        if any([block in entry.name for block in blacklist]):
+            continue
+        if skip and entry.name in skip:
             continue
-        subprocess.run(['cp', '-r', file, dst])
+        yield entry
+
+
+def copy_tree_evaluation(src, dst, skip=None, shared=None):
+    os.makedirs(dst, exist_ok=True)
+    if not shared:
+        for entry in _evaluation_entries(src, skip=skip):
+            if entry.is_dir():
+                clone_tree(entry.path, os.path.join(dst, entry.name))
+            else:
+                clone_file(entry.path, os.path.join(dst, entry.name))
+        return
+
+    # populate the shared directory once, link its entries into the experiment
+    shared = os.path.abspath(shared)
+    with _SHARED_EVALUATION_LOCK:
+        if shared not in _SHARED_EVALUATION:
+            log.info('Populating shared evaluation directory %s', shared)
+            copy_tree_evaluation(src, shared, skip=skip)
+            _SHARED_EVALUATION.add(shared)
+    for entry in _evaluation_entries(src, skip=skip):
+        target = os.path.join(dst, entry.name)
+        link = os.path.relpath(os.path.join(shared, entry.name), os.path.realpath(dst))
+        if os.path.islink(target) and os.readlink(target) == link:
+            continue
+        if os.path.isdir(target) and not os.path.islink(target):
+            shutil.rmtree(target)
+        elif os.path.lexists(target):
+            os.remove(target)
+        os.symlink(link, target)
 
 
-def generate_evaluation(spec):
+def generate_evaluation(spec, shared=None):
     log.info('Copying evaluation scripts')
     subdir = 'deps/plot_scripts'
     src = os.path.join(BASEPATH, subdir)
     dst = os.path.join(spec['meta']['outdir'], DIRS['evaluation'])
 
-    copy_tree_evaluation(src, dst)
-    try:
-        shutil.rmtree(os.path.join(dst, 'util', '__pycache__'))
-    except FileNotFoundError:
-        pass
+    # templated files are rendered separately
+    templated_files = [
+        'plot_throughput.ipynb',
+        'plot_throughput.py',
+        'plot_latency.ipynb',
+        'plot_latency.py',
+        'plot_perf_stat.ipynb',
+        'plot_perf_stat.py',
+    ]
+    copy_tree_evaluation(src, dst, skip=templated_files, shared=shared)
 
     log.info('Inserting evaluation configuration')
     m = spec['model']
@@ -120,22 +229,19 @@ def generate_evaluation(spec):
         'perf_stat_events':  [(event, name) for event, name in spec['metrics']['perf'].items()],
     }
     templated = 'configuration = {}'.format(json.dumps(config)).replace('"', "'")
-    for filename in [os.path.join(spec['meta']['outdir'], DIRS['evaluation'], 'plot_throughput.ipynb'),
-                     os.path.join(spec['meta']['outdir'], DIRS['evaluation'], 'plot_throughput.py'),
-                     os.path.join(spec['meta']['outdir'], DIRS['evaluation'], 'plot_latency.ipynb'),
-                     os.path.join(spec['meta']['outdir'], DIRS['evaluation'], 'plot_latency.py'),
-                     os.path.join(spec['meta']['outdir'], DIRS['evaluation'], 'plot_perf_stat.ipynb'),
-                     os.path.join(spec['meta']['outdir'], DIRS['evaluation'], 'plot_perf_stat.py')]:
-        with open(filename, 'r+') as fh:
-            content = fh.read()
-            template = NotebookTemplate(content)
-            finished = template.substitute(configuration=templated)
-            fh.seek(0)
-            fh.write(finished)
+    manifest = get_manifest(spec['meta']['outdir'])
+    for filename in templated_files:
+        with open(os.path.join(src, filename)) as fh:
+            template = NotebookTemplate(fh.read())
+        finished = template.substitute(configuration=templated)
+        manifest.write(os.path.join(DIRS['evaluation'], filename), finished)
     files = [
         {
             'template': 'run.sh',
-            'to': os.path.join(DIRS['evaluation'], 'run_evaluation.sh')
+            'to': os.path.join(DIRS['evaluation'], 'run_evaluation.sh'),
+            'variables': {
+                'dut': spec['node_config']['dut']['name']
+            }
         }, {
             'template': 'setup.sh',
             'to': os.path.join(DIRS['evaluation'], 'setup_evaluation.sh')
@@ -153,7 +259,7 @@ def generate_evaluation(spec):
     copy_templates_to_experiment(files, 'evaluation', spec['meta']['outdir'])
 
 
-def generate_p4_planes(spec, suffix=None,
+def generate_p4_planes(spec, suffix=None, cache=None, generator=None,
                        baseline=False,
                        number_header_fields=1,
                        header_field_size=8,
@@ -182,8 +288,7 @@ def generate_p4_planes(spec, suffix=None,
     if suffix:
         dut_config_path = os.path.join(dut_config_path, suffix)
     outdir = os.path.join(spec['meta']['outdir'], dut_config_path)
-    if not os.path.isdir(outdir):
-        os.makedirs(outdir)
+    os.makedirs(outdir, exist_ok=True)
 
     dummy_ethernet = True
     if baseline:
@@ -195,8 +300,9 @@ def generate_p4_planes(spec, suffix=None,
     if add_uninteresting_header:
         dummy_ethernet = False
 
+    # arguments without output directory, these identify the generated program
     cmd = [
-        'python3', 'deps/p4gen16/generate.py', '-t', spec['program']['architecture'], '-o', outdir,
+        '-t', spec['program']['architecture'],
         '--default-egress-spec', str(spec['node_config']['dut']['port']['tx']),
         '--header-fields', str(number_header_fields),
         '--header-field-size', str(header_field_size),
@@ -231,8 +337,18 @@ def generate_p4_planes(spec, suffix=None,
         cmd += ['--default-action', default_action]
     if match_last:
         cmd += ['--match-last']
-    #log.debug(' '.join(cmd))
-    subprocess.run(cmd, check=True)
+    key = cache.key(cmd) if cache else None
+    if cache and cache.restore(key, outdir):
+        log.debug('using cached P4 program for %s', outdir)
+    else:
+        #log.debug(' '.join(cmd))
+        if generator:
+            generator.run(outdir, cmd)
+        else:
+            subprocess.run(['python3', GENERATE, '-o', outdir] + cmd, check=True)
+        if cache:
+            cache.store(key, outdir)
+    manifest = get_manifest(spec['meta']['outdir'])
     files = [
         {
             'to': os.path.join(dut_config_path, 'program.p4'),
@@ -250,6 +366,49 @@ def generate_p4_planes(spec, suffix=None,
             'copy': '/root/t4p4s/t4p4s/src/hardware_indep/controlplane{}.c.py'.format('_' + suffix if suffix else ''),
             'device': DUT
         })
+    for file in files:
+        manifest.track(file['to'])
+    if skip_filling_tables and number_table_entries:
+        # table contents as binary records, the control plane loads them with mmap
+        relpath = os.path.join(dut_config_path, 'table_entries.bin')
+        manifest.write(relpath, bulk_file(
+            number_tables, number_table_entries, match_type, key_size(number_match_keys, match_key_size)))
+        files.append({
+            'to': relpath,
+            'copy': '/root/t4p4s/t4p4s/table_entries{}.bin'.format('_' + suffix if suffix else ''),
+            'device': DUT
+        })
+    return files
+
+
+def generate_p4_programs(spec, jobs=1, cache=None, generator=None):
+    scale = spec['program']['scale']
+    if not scale:
+        return generate_p4_planes(spec, cache=cache, generator=generator, **spec['program']['args'])
+
+    # one program per scale point, each in its own dut/config/<suffix> directory
+    values = spec['metrics']['scale'][scale['with']]
+    log.info('Generating %d P4 programs using %d jobs', len(values), jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for val in values:
+            args = dict(spec['program']['args'])
+            args[scale['arg']] = val
+            futures.append((val, executor.submit(generate_p4_planes, spec, suffix=str(val),
+                                                 cache=cache, generator=generator, **args)))
+
+    # collect in order of the scale points to keep the file list deterministic
+    files = []
+    failed = []
+    for val, future in futures:
+        try:
+            files += future.result()
+        except Exception as e:
+            log.error('Generating P4 program for %s=%s failed: %s', scale['with'], val, e)
+            failed.append(val)
+    if failed:
+        log.error('Failed to generate P4 programs for %s: %s', scale['with'], ', '.join(str(val) for val in failed))
+        sys.exit(4)
     return files
 
 
@@ -259,16 +418,14 @@ def copy_templates_to_experiment(files, subdir, outdir):
         dst = file['to']
         log.debug('copying %s -> %s', src, dst)
         src = os.path.join(subdir, src)
-        dst = os.path.join(outdir, dst)
         template = None
         if file.get('environment', 'default') == 'C':
             template = JINJA_C.get_template(src)
         else:
             # the default
             template = JINJA.get_template(src)
-        with open(dst, 'w') as outf:
-            variables = file.get('variables', {})
-            outf.write(template.render(**variables))
+        variables = file.get('variables', {})
+        get_manifest(outdir).write(dst, template.render(**variables))
 
 
 def generate_loadgen(spec):
@@ -277,6 +434,31 @@ def generate_loadgen(spec):
     # pos setup and variables
     testbed_manual = spec['meta']['testbed'] == 'manual'
     fixed_packet_size = spec['traffic']['packet_size'] if 'packet_size' not in spec['metrics']['scale'] else False
+    # specifications of older experiments have no generator and patterns
+    generator = spec['traffic'].get('generator', {
+        'tx_ports': [spec['node_config']['loadgen']['port']['tx']],
+        'tx_queues': 4,
+        'speed': 10,
+    })
+    keys = spec['traffic'].get('keys', {'distribution': 'uniform'})
+    latency_recorder = spec['metrics'].get('latency_recorder', {})
+    lua_variables = {
+        'payload_u32_offset': spec['traffic']['payload_u32_offset'],
+        'packet_ring': spec['traffic'].get('packet_ring', False),
+        'tx_queues': generator['tx_queues'],
+        'max_rate': int(float(spec['traffic']['load']['max']) * 1000),
+        'link_speed': generator['speed'],
+        'pattern': spec['traffic']['pattern'],
+        'burst_size': spec['traffic'].get('burst_size'),
+        'key_distribution': keys['distribution'],
+        'zipf_s': keys.get('s'),
+        'hot_fraction': keys.get('hot_fraction'),
+        'hot_share': keys.get('hot_share'),
+        'imix': spec['traffic'].get('imix', False),
+        'latency_digits': latency_recorder.get('digits'),
+        'probe_rate': latency_recorder.get('probe_rate'),
+        'latency_interval': latency_recorder.get('interval'),
+    }
     files = [
         {
             'template': 'testbed/measurement.sh',
@@ -285,8 +467,12 @@ def generate_loadgen(spec):
                 'testbed_manual': testbed_manual,
                 'scale_table_entries': 'table_entries' in spec['metrics']['scale'],
                 'scale_packet_size': 'packet_size' in spec['metrics']['scale'],
+                'sweep': 'sweep' in spec['traffic'],
+                'sweep_packet_size': bool(swept_packet_sizes(spec)),
                 'scale_load': 'load_rate' in spec['metrics']['scale'],
                 'measure_latency': 'latency' in spec['metrics']['names'],
+                'measure_zero_loss': 'zero_loss' in spec['metrics']['names'],
+                'latency_recorder': bool(latency_recorder),
             }
         }, {
             'template': 'testbed/setup.sh',
@@ -296,7 +482,7 @@ def generate_loadgen(spec):
             'to': os.path.join(DIRS['lg'], 'variables.yml'),
             'variables': {
                 'port': {
-                    'tx': spec['node_config']['loadgen']['port']['tx'],
+                    'tx': ','.join(str(port) for port in generator['tx_ports']),
                     'rx': spec['node_config']['loadgen']['port']['rx']
                 },
                 'packet_size': fixed_packet_size,
@@ -306,17 +492,19 @@ def generate_loadgen(spec):
             'to': os.path.join(DIRS['lg_script'], 'max-load.lua'),
             'copy': '/root/',
             'device': LG,
-            'variables': {
-                'payload_u32_offset': spec['traffic']['payload_u32_offset'],
-            }
+            'variables': lua_variables,
         }, {
             'template': 'lua/latency.lua',
             'to': os.path.join(DIRS['lg_script'], 'latency.lua'),
             'copy': '/root/',
             'device': LG,
-            'variables': {
-                'payload_u32_offset': spec['traffic']['payload_u32_offset'],
-            }
+            'variables': lua_variables,
+        }, {
+            'template': 'lua/zero-loss.lua',
+            'to': os.path.join(DIRS['lg_script'], 'zero-loss.lua'),
+            'copy': '/root/',
+            'device': LG,
+            'variables': lua_variables,
         }, {
             'template': 'util/get_max_rate.py',
             'to': os.path.join(DIRS['lg_util'], 'get_max_rate.py'),
@@ -341,19 +529,21 @@ def generate_t4p4s_setup(spec):
 
     tx = spec['node_config']['dut']['port']['tx']
     rx = spec['node_config']['dut']['port']['rx']
+    # one rx port per tx port of the loadgen
+    ports = [tx] + (rx if isinstance(rx, list) else [rx])
     coremask = []
-    portmask = '{0:X}'.format((1 << tx) | (1 << rx))
+    portmask = '{0:X}'.format(sum(set(1 << port for port in ports)))
+    # cores local to the ports first, each serving a queue of the ports on its socket
     cpq_map = []
-    cores = spec['node_config']['dut']['cores']
+    cores = order_cores(spec['node_config']['dut'], ports)
+    perf_groups = group_events(list(spec['metrics']['perf']), spec['node_config']['dut'].get('microarchitecture'))
     for i, _ in enumerate(cores):
         cmask = 0
-        cpq = []
-        for idx, coreid in enumerate(cores[0:i+1]):
+        for coreid in cores[0:i+1]:
             cmask |= 1 << coreid
-            for port in [tx, rx]:
-                cpq.append('({},{},{})'.format(port, idx, coreid))
+        cpq = port_queues(spec['node_config']['dut'], ports, cores[0:i+1])
         coremask.append('{0:X}'.format(cmask))
-        cpq_map.append(','.join(cpq))
+        cpq_map.append(','.join('({},{},{})'.format(*queue) for queue in cpq))
 
     default_commits = {
         't4p4s_commit': '0a6c455846f201432a53dc9347909ae933ec0b32',
@@ -361,15 +551,30 @@ def generate_t4p4s_setup(spec):
         'hlir16': 'c9408db9b970493259e0b5cc27efc39063a73cd3',
         'p4c': 'ecba24ad591e719268860f66202530830d2a914e',
         'p4runtime': '',
-        'protobuf': 'v3.9.2'
+        'protobuf': 'v3.9.2',
+        'dpdk': '19.02'
     }
 
     # pos setup and variables
     testbed_manual = spec['meta']['testbed'] == 'manual'
     multiple_programs = spec['program']['scale']['with'] if spec['program']['scale'] else False
+    table_mode = spec['program'].get('table_mode', 'replica')
+    # single replica tables are updated in place
+    table_qsbr = table_mode == 'rcu'
+    # table size header per program
+    update_tables = spec['program']['args']['skip_filling_tables'] and \
+        spec['program']['scale'] and spec['program']['scale']['arg'] == 'number_table_entries'
     update_controlplane = any([key in spec['metrics']['scale'] for key in ['tables', 'table_entries', 'action_data']])
     increase_max_wait = any([key in spec['metrics']['scale'] for key in ['tables', 'meta_field_writes']])
-    increase_wait = any([key in spec['metrics']['scale'] for key in ['tables', 'table_entries']])
+    # the dataplane reports every table filled by the control plane, only
+    # tables with entries are filled, the others keep their default action
+    wait_tables = spec['program']['args']['skip_filling_tables'] and \
+        (spec['program']['args']['number_table_entries'] > 0 or update_tables)
+    expected_tables = spec['program']['args']['number_tables']
+    if spec['program']['scale'] and spec['program']['scale']['arg'] == 'number_tables':
+        expected_tables = '${INDEX}'
+    # table entries are deployed as bulk-load file
+    bulk_tables = wait_tables
     files = [
         {
             'template': 'testbed/measurement.sh',
@@ -379,8 +584,14 @@ def generate_t4p4s_setup(spec):
                 'multiple_programs': multiple_programs,
                 'scale_frequency': 'cpu_frequency' in spec['metrics']['scale'],
                 'update_controlplane': update_controlplane,
+                'update_tables': update_tables,
+                'table_qsbr': table_qsbr,
+                'sweep_packet_size': bool(swept_packet_sizes(spec)),
                 'increase_max_wait': increase_max_wait,
-                'increase_wait': increase_wait,
+                'wait_tables': wait_tables,
+                'bulk_tables': bulk_tables,
+                'expected_tables': expected_tables,
+                'nb_ports': len(set(ports)),
             }
         }, {
             'template': 'testbed/setup.sh',
@@ -397,7 +608,8 @@ def generate_t4p4s_setup(spec):
                     'rx': rx
                 },
                 'cpu_frequency': max(spec['node_config']['dut']['cpu_frequencies']),
-                'events': ','.join(spec['metrics']['perf'].keys()),
+                'perf_runs': perf_runs(perf_groups),
+                'events': ';'.join(','.join(group) for group in perf_groups),
                 'commits': default_commits,
             }
         }, {
@@ -411,6 +623,7 @@ def generate_t4p4s_setup(spec):
                 'coremasks': coremask,
                 'portmask': portmask,
                 'cpq_maps': cpq_map,
+                'nb_ports': len(set(ports)),
             },
             'to': os.path.join(DIRS['dut_config'], 'opts_dpdk.cfg'),
             'copy': '/root/t4p4s/t4p4s/',
@@ -424,6 +637,18 @@ def generate_t4p4s_setup(spec):
         }
     ]
 
+    # builds keyed by sources, options and pinned commits
+    files.append({
+        'template': 'testbed/build_cache.sh',
+        'variables': {
+            'commits': default_commits,
+            'max_entries': 100,
+        },
+        'to': os.path.join(DIRS['dut'], 'build_cache.sh'),
+        'copy': '/root/t4p4s_build_cache.sh',
+        'device': DUT
+    })
+
     for i, _ in enumerate(cores):
         i += 1
         files.append({
@@ -440,29 +665,47 @@ def generate_t4p4s_setup(spec):
     # increase table entries limit
     if spec['program']['args']['skip_filling_tables']:
         tables = 't4p4s/dpdk_tables.h'
-        files += [{
+        scale = spec['program']['scale']
+        if scale and scale['arg'] == 'number_table_entries':
+            # table size of each program, deployed next to it
+            for val in spec['metrics']['scale'][scale['with']]:
+                files.append({
+                    'template': tables,
+                    'to': os.path.join(DIRS['dut_config'], str(val), 'dpdk_tables.h'),
+                    'copy': '/root/t4p4s/t4p4s/src/hardware_dep/dpdk/includes/dpdk_tables_{}.h'.format(val),
+                    'device': DUT,
+                    'variables': {
+                        'table_entries': table_size(val)
+                    }
+                })
+        else:
+            files.append({
                 'template': tables,
                 'to': os.path.join(DIRS['dut_config'], 'dpdk_tables.h'),
                 'copy': '/root/t4p4s/t4p4s/src/hardware_dep/dpdk/includes/dpdk_tables.h',
                 'device': DUT,
                 'variables': {
-                        'table_entries': 20000000 if 'table_entries' in spec['metrics']['scale'] else 1000
-                    }
-            }, {
-                'template': 't4p4s/dpdk_lib_change_tables.c',
-                'to': os.path.join(DIRS['dut_config'], 'dpdk_lib_change_tables.c'),
-                'copy': '/root/t4p4s/t4p4s/src/hardware_dep/dpdk/data_plane/dpdk_lib_change_tables.c',
-                'device': DUT
-            }
-        ]
+                    'table_entries': table_size(spec['program']['args']['number_table_entries'])
+                }
+            })
+    # batched table updates of the controller, the fill at startup and single replica tables
+    files.append({
+        'template': 't4p4s/dpdk_lib_change_tables.c',
+        'to': os.path.join(DIRS['dut_config'], 'dpdk_lib_change_tables.c'),
+        'copy': '/root/t4p4s/t4p4s/src/hardware_dep/dpdk/data_plane/dpdk_lib_change_tables.c',
+        'device': DUT
+    })
 
     # this fixes a bug in the t4p4s code that no deparser modifications are performed
-    if any([key in spec['metrics']['scale'] for key in ['added_headers', 'removed_headers', 'added_headers_size']]):
+    emit_reordering = any([key in spec['metrics']['scale'] for key in ['added_headers', 'removed_headers', 'added_headers_size']])
+    # the dataplane reports its quiescent states for single replica tables
+    if emit_reordering or table_qsbr:
         files.append({
             'template': 't4p4s/dataplane.c.py',
             'environment': 'C',
             'variables': {
-                'emit_reordering': True,
+                'emit_reordering': emit_reordering,
+                'table_qsbr': table_qsbr,
             },
             'to': os.path.join(DIRS['dut_config'], 'dataplane.c.py'),
             'copy': '/root/t4p4s/t4p4s/src/hardware_indep/dataplane.c.py',
@@ -472,7 +715,8 @@ def generate_t4p4s_setup(spec):
     bootparameters = [
         {
             'device': '${DUT}',
-            'parameters': 'isolcpus=0-6 intel_pstate=disable default_hugepagesz=1G hugepagesz=1G hugepages=16',
+            'parameters': ' '.join(isolation_parameters(spec['node_config']['dut'], cores) +
+                                   ['intel_pstate=disable', 'default_hugepagesz=1G', 'hugepagesz=1G', 'hugepages=16']),
         }
     ]
 
@@ -519,12 +763,38 @@ def generate_pos_experiment(spec, previous_files, bootparameters=None):
             'to': os.path.join(DIRS['experiment'], 'global-variables.yml'),
             'variables': {
                 'scale_load': 'load_rate' in spec['metrics']['scale'],
-                'repetitions': spec['meta']['max_load_repetitions']
+                'repetitions': spec['meta']['max_load_repetitions'],
+                'min_repetitions': spec['meta']['min_load_repetitions'],
+                'target_ci': spec['meta']['target_ci'],
+                'zero_loss': spec['traffic'].get('zero_loss'),
+                'sweep': spec['traffic'].get('sweep'),
+                'sweep_packet_sizes': swept_packet_sizes(spec),
+                'duration': spec['meta']['duration'],
             }
         },
     ]
     copy_templates_to_experiment(files, 'pos', spec['meta']['outdir'])
-    return files
+
+    # redeploy only what changed since the last generation
+    manifest = get_manifest(spec['meta']['outdir'])
+    variables_files = [
+        {'from': os.path.join(DIRS['lg'], 'variables.yml'), 'device': '${LG}'},
+        {'from': os.path.join(DIRS['dut'], 'variables.yml'), 'device': '${DUT}'},
+        {'from': os.path.join(DIRS['experiment'], 'global-variables.yml'), 'device': '${LG}', 'option': '--as-global'},
+        {'from': os.path.join(DIRS['experiment'], 'loop-variables.yml'), 'device': '${LG}', 'option': '--as-loop'},
+    ]
+    redeploy = [
+        {
+            'template': 'redeploy.sh',
+            'variables': {
+                'variables': [var for var in variables_files if manifest.is_changed(var['from'])],
+                'copy': [cp for cp in files_to_copy_setup + files_to_copy if manifest.is_changed(cp['from'])],
+            },
+            'to': os.path.join(DIRS['experiment'], 'redeploy.sh')
+        },
+    ]
+    copy_templates_to_experiment(redeploy, 'pos', spec['meta']['outdir'])
+    return files + redeploy
 
 
 def create_directories(outdir):
@@ -537,9 +807,11 @@ def create_directories(outdir):
         os.makedirs(os.path.join(outdir, subdir), exist_ok=True)
 
 
-def generate(spec):
+def generate(spec, jobs=1, cache=None, generator=None, shared_evaluation=None):
     ## dirs
     create_directories(spec['meta']['outdir'])
+    # only files with changed content are written
+    open_manifest(spec['meta']['outdir'])
 
     dump_specification(spec)
 
@@ -550,30 +822,28 @@ def generate(spec):
 
     ## DUT
     # p4 program
-    scale = spec['program']['scale']
-    if scale:
-        for val in spec['metrics']['scale'][scale['with']]:
-            spec['program']['args'][scale['arg']] = val
-            generate_p4_planes(spec, suffix=str(val), **spec['program']['args'])
-    else:
-        generate_p4_planes(spec, **spec['program']['args'])
+    program_files = generate_p4_programs(spec, jobs=jobs, cache=cache, generator=generator)
 
     # testbed setup for concrete target
     bootparameters = None
     if spec['meta']['target'] == 'p4_t4p4s':
         _files, bootparameters = generate_t4p4s_setup(spec)
         files += _files
+        # generated programs are deployed with the matching table headers
+        files += program_files
     else:
         log.error('Testbed not yet supported')
         sys.exit(3)
 
+    # variables that shall be looped over for this measurement series
+    generate_loop_variables(spec)
+
     ## testbed setup
     # needs to take care of deploying all files and starting the measurements
     if spec['meta']['testbed'] == 'pos':
         files += generate_pos_experiment(spec, files, bootparameters=bootparameters)
 
-    # variables that shall be looped over for this measurement series
-    generate_loop_variables(spec)
-
     # generate evaluation
-    generate_evaluation(spec)
+    generate_evaluation(spec, shared=shared_evaluation)
+
+    close_manifest(spec['meta']['outdir'])
@@ -0,0 +1,112 @@
+'''
+manifest of content hashes of all files rendered into an experiment
+'''
+
+
+import os
+import hashlib
+import threading
+import logging as log
+import yaml
+
+
+MANIFEST = 'manifest.yml'
+
+# open manifests per experiment output directory
+_MANIFESTS = {}
+_LOCK = threading.Lock()
+
+
+def _digest(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+class Manifest:
+    '''
+    writes rendered files only if their content changed since the last
+    generation, keeping the mtime of unchanged files for redeployment
+    '''
+
+    def __init__(self, outdir):
+        self.outdir = outdir
+        self.path = os.path.join(outdir, MANIFEST)
+        self.previous = {}
+        if os.path.isfile(self.path):
+            with open(self.path) as fh:
+                self.previous = (yaml.safe_load(fh.read()) or {}).get('files', {})
+        self.hashes = {}
+        self.changed = []
+        self.lock = threading.Lock()
+
+    def write(self, relpath, content):
+        if isinstance(content, str):
+            content = content.encode()
+        digest = _digest(content)
+        target = os.path.join(self.outdir, relpath)
+        unchanged = self.previous.get(relpath) == digest and \
+            os.path.isfile(target) and os.path.getsize(target) == len(content)
+        if not unchanged:
+            # replace instead of writing in place, the file may be a hardlink
+            tmp = target + '.tmp'
+            with open(tmp, 'wb') as outfile:
+                outfile.write(content)
+            os.replace(tmp, target)
+        with self.lock:
+            self.hashes[relpath] = digest
+            if not unchanged:
+                self.changed.append(relpath)
+        return not unchanged
+
+    def track(self, relpath):
+        # files written by other tools, e.g. the P4 program generator
+        target = os.path.join(self.outdir, relpath)
+        if not os.path.isfile(target):
+            return False
+        with open(target, 'rb') as infile:
+            digest = _digest(infile.read())
+        changed = self.previous.get(relpath) != digest
+        with self.lock:
+            self.hashes[relpath] = digest
+            if changed:
+                self.changed.append(relpath)
+        return changed
+
+    def is_changed(self, relpath):
+        with self.lock:
+            return relpath in self.changed
+
+    def save(self):
+        with self.lock:
+            content = {
+                # files not rendered this time are kept, e.g. for partial regeneration
+                'files': dict(sorted(dict(self.previous, **self.hashes).items())),
+                'changed': sorted(self.changed),
+            }
+        with open(self.path, 'w') as outfile:
+            outfile.write(yaml.dump(content))
+        if self.changed:
+            log.info('%d of %d generated files changed', len(self.changed), len(self.hashes))
+            for relpath in sorted(self.changed):
+                log.debug('changed: %s', relpath)
+        else:
+            log.info('No generated file changed')
+
+
+def open_manifest(outdir):
+    with _LOCK:
+        _MANIFESTS[outdir] = Manifest(outdir)
+        return _MANIFESTS[outdir]
+
+
+def get_manifest(outdir):
+    with _LOCK:
+        if outdir not in _MANIFESTS:
+            _MANIFESTS[outdir] = Manifest(outdir)
+        return _MANIFESTS[outdir]
+
+
+def close_manifest(outdir):
+    with _LOCK:
+        manifest = _MANIFESTS.pop(outdir)
+    manifest.save()
+    return manifest
@@ -0,0 +1,129 @@
+'''
+run the p4gen16 program generator, either in-process or as a subprocess
+'''
+
+
+import os
+import sys
+import time
+import inspect
+import threading
+import subprocess
+import importlib.util
+import multiprocessing
+import logging as log
+from concurrent.futures import ProcessPoolExecutor
+
+
+GENERATE = os.path.join('deps', 'p4gen16', 'generate.py')
+
+MODES = [
+    'library',
+    'subprocess',
+]
+
+# programs generated as subprocess for comparison before the speedup is logged
+REFERENCE_PROGRAMS = 3
+
+# generator module, loaded once per (worker) process
+_MODULE = None
+
+
+def _load_module():
+    global _MODULE
+    if _MODULE is not None:
+        return _MODULE
+    # p4gen16 imports its own modules relative to its directory
+    path = os.path.abspath(os.path.dirname(GENERATE))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location('p4gen16_generate', GENERATE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not callable(getattr(module, 'main', None)):
+        raise ImportError('{} has no main()'.format(GENERATE))
+    _MODULE = module
+    return module
+
+
+def _run_library(argv):
+    module = _load_module()
+    start = time.perf_counter()
+    saved = sys.argv
+    sys.argv = [GENERATE] + argv
+    try:
+        # the module and its templates stay loaded, only main runs per program
+        if inspect.signature(module.main).parameters:
+            module.main(argv)
+        else:
+            module.main()
+    except SystemExit as e:
+        if e.code:
+            raise subprocess.CalledProcessError(e.code, [GENERATE] + argv)
+    finally:
+        sys.argv = saved
+    return time.perf_counter() - start
+
+
+class Generator:
+    '''
+    runs p4gen16 with the given arguments
+
+    In library mode the generator is imported once per worker process of a
+    pool and its main() is called for every program, reusing the parsed
+    templates. The subprocess mode starts one interpreter per program and is
+    used as fallback if p4gen16 cannot be imported or has no main(). The
+    first REFERENCE_PROGRAMS programs of library mode run as subprocess to
+    compare both.
+    '''
+
+    def __init__(self, mode='library', jobs=1):
+        self.mode = mode
+        self.jobs = jobs
+        self.pool = None
+        self.reference = REFERENCE_PROGRAMS if mode == 'library' else 0
+        self.timings = {mode: [] for mode in MODES}
+        self.lock = threading.Lock()
+        if mode == 'library':
+            try:
+                _load_module()
+            except Exception as e:
+                log.warning('Cannot import p4gen16 (%s), falling back to subprocess', e)
+                self.mode = 'subprocess'
+                self.reference = 0
+            else:
+                # forking a parent that already runs generator threads is unsafe
+                self.pool = ProcessPoolExecutor(max_workers=jobs,
+                                                mp_context=multiprocessing.get_context('forkserver'),
+                                                initializer=_load_module)
+
+    def run(self, outdir, args):
+        argv = ['-o', outdir] + args
+        with self.lock:
+            # time the first programs as subprocess for comparison
+            mode = 'subprocess' if self.reference else self.mode
+            self.reference = max(0, self.reference - 1)
+        if mode == 'library':
+            elapsed = self.pool.submit(_run_library, argv).result()
+        else:
+            start = time.perf_counter()
+            subprocess.run(['python3', GENERATE] + argv, check=True)
+            elapsed = time.perf_counter() - start
+        with self.lock:
+            self.timings[mode].append(elapsed)
+
+    def log_statistics(self):
+        with self.lock:
+            means = {}
+            for mode, timings in self.timings.items():
+                if timings:
+                    means[mode] = sum(timings) / len(timings)
+                    log.info('p4gen16 %s: %d programs, %.3f s mean per program', mode, len(timings), means[mode])
+            # a single program says little about the speedup
+            if all(len(self.timings[mode]) >= REFERENCE_PROGRAMS for mode in MODES) and means['library'] > 0:
+                log.info('p4gen16 library mode %.1fx faster than subprocess', means['subprocess'] / means['library'])
+
+    def shutdown(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,50 @@
+'''
+perf stat events of the DuT split into groups that fit the hardware counters,
+so that perf does not multiplex and scale the counts
+'''
+
+
+import math
+import logging as log
+
+
+# general purpose counters per logical cpu with SMT enabled, and the events
+# counted by fixed counters next to them
+MICROARCHITECTURES = {
+    'default': {'counters': 4, 'fixed': ['cycles', 'cpu-cycles', 'instructions', 'ref-cycles']},
+    'sandybridge': {'counters': 4, 'fixed': ['cycles', 'cpu-cycles', 'instructions', 'ref-cycles']},
+    'haswell': {'counters': 4, 'fixed': ['cycles', 'cpu-cycles', 'instructions', 'ref-cycles']},
+    'broadwell': {'counters': 4, 'fixed': ['cycles', 'cpu-cycles', 'instructions', 'ref-cycles']},
+    'skylake': {'counters': 4, 'fixed': ['cycles', 'cpu-cycles', 'instructions', 'ref-cycles']},
+    'icelake': {'counters': 8, 'fixed': ['cycles', 'cpu-cycles', 'instructions', 'ref-cycles', 'slots']},
+    'zen': {'counters': 6, 'fixed': []},
+    'zen2': {'counters': 6, 'fixed': []},
+    'zen3': {'counters': 6, 'fixed': []},
+}
+# minimum number of perf stat runs per measurement
+RUNS = 4
+
+
+def group_events(events, microarchitecture=None):
+    '''
+    groups of events that are counted together, the fixed counter events are
+    part of every group as they do not take a general purpose counter
+    '''
+    if microarchitecture not in MICROARCHITECTURES:
+        if microarchitecture is not None:
+            log.warning('Unknown microarchitecture %s, assuming %d perf counters',
+                        microarchitecture, MICROARCHITECTURES['default']['counters'])
+        microarchitecture = 'default'
+    limits = MICROARCHITECTURES[microarchitecture]
+    fixed = [event for event in events if event in limits['fixed']]
+    general = [event for event in events if event not in limits['fixed']]
+    size = limits['counters']
+    groups = [general[i:i + size] + fixed for i in range(0, len(general), size)] or [fixed]
+    if len(groups) > 1:
+        log.info('Splitting %d perf events into %d groups of at most %d counters', len(events), len(groups), size)
+    return groups
+
+
+def perf_runs(groups, runs=RUNS):
+    # every group is recorded in the same number of runs
+    return math.ceil(runs / len(groups)) * len(groups)
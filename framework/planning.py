@@ -0,0 +1,150 @@
+'''
+estimate the testbed time of an experiment and thin it to a time budget
+'''
+
+
+import math
+import itertools
+import logging as log
+
+from framework.adaptive import coarse_grid, model_bounds
+
+
+# waits of the generated measurement scripts, in seconds
+MIN_WAIT = 15      # minimum MAX_WAIT of the DuT for t4p4s to compile and start
+DUT_STARTUP = 5    # typical wait until the ports of t4p4s are up
+LG_STARTUP = 5     # typical wait of the loadgen until forwarding is verified
+# rough time for reboot, MoonGen and t4p4s bootstrap of both hosts
+SETUP = 45 * 60
+
+
+def _values(spec, dimension):
+    values = spec['metrics']['scale'][dimension]
+    return values if isinstance(values, list) else [values]
+
+
+def loop_points(spec):
+    dimensions = sorted(spec['metrics']['scale'])
+    for values in itertools.product(*[_values(spec, dimension) for dimension in dimensions]):
+        yield dict(zip(dimensions, values))
+
+
+def swept_packet_sizes(spec):
+    '''
+    packet sizes MoonGen steps through in one process instead of a pos loop
+    variable, empty without an in-process sweep
+    '''
+    sizes = spec['metrics']['scale'].get('packet_size')
+    if 'sweep' not in spec['traffic'] or not isinstance(sizes, list) or len(sizes) < 2:
+        return []
+    return sizes
+
+
+def point_duration(spec, point):
+    # mirrors the waits of the DuT and loadgen measurement.sh
+    scale = spec['metrics']['scale']
+    duration = spec['meta']['duration']
+    index = point[spec['program']['scale']['with']] if spec['program']['scale'] else None
+
+    max_wait = MIN_WAIT
+    if index is not None and any([key in scale for key in ['tables', 'meta_field_writes']]):
+        max_wait = max(MIN_WAIT, index)
+    controller_startup = 0
+    if index is not None and any([key in scale for key in ['tables', 'table_entries']]):
+        controller_startup = index / 1000000
+
+    # an in-process sweep shares the startup among the packet sizes and settles per step
+    steps = len(swept_packet_sizes(spec)) or 1
+    settle = spec['traffic']['sweep']['settle'] if steps > 1 else 0
+
+    startup = max_wait + DUT_STARTUP + controller_startup + LG_STARTUP
+    repetition = startup / steps + settle + duration['max_load']
+    total = spec['meta']['max_load_repetitions'] * repetition
+    if 'zero_loss' in spec['metrics']['names']:
+        zero_loss = spec['traffic']['zero_loss']
+        total += LG_STARTUP + zero_loss['max_trials'] * (zero_loss['trial'] + 1)
+    if 'latency' in spec['metrics']['names']:
+        rates = 1 if 'load_rate' in scale else len(spec['traffic']['load']['latency'])
+        if 'sweep' in spec['traffic']:
+            total += LG_STARTUP / steps + rates * (spec['traffic']['sweep']['settle'] + duration['latency'])
+        else:
+            total += rates * (LG_STARTUP + duration['latency'])
+    return total
+
+
+def estimate(spec):
+    per_dimension = {dimension: {value: 0 for value in _values(spec, dimension)}
+                     for dimension in spec['metrics']['scale']}
+    points = 0
+    measurement = 0
+    for point in loop_points(spec):
+        seconds = point_duration(spec, point)
+        points += 1
+        measurement += seconds
+        for dimension, value in point.items():
+            per_dimension[dimension][value] += seconds
+    return {
+        'points': points,
+        'setup': SETUP,
+        'measurement': measurement,
+        'total': SETUP + measurement,
+        'per_dimension': per_dimension,
+    }
+
+
+def _hours(seconds):
+    return '{:.2f} h'.format(seconds / 3600)
+
+
+def print_estimate(spec):
+    result = estimate(spec)
+    print('experiment: {}'.format('/'.join([spec['meta']['target'], spec['meta']['component'], spec['meta']['feature']])))
+    print('loop points: {}'.format(result['points']))
+    print('setup: {}'.format(_hours(result['setup'])))
+    print('measurement: {}'.format(_hours(result['measurement'])))
+    print('total: {}'.format(_hours(result['total'])))
+    rows = [('dimension', 'values', 'per value (min)', 'per value (max)')]
+    for dimension, times in sorted(result['per_dimension'].items()):
+        rows.append((dimension, str(len(times)), _hours(min(times.values())), _hours(max(times.values()))))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def _thin(spec, dimension, x_axis_bounds):
+    values = _values(spec, dimension)
+    if len(values) > 2:
+        thinned = coarse_grid(values, math.ceil(len(values) / 2))
+    else:
+        thinned = values[:1]
+    log.info('Thinning %s from %d to %d values', dimension, len(values), len(thinned))
+    spec['metrics']['scale'][dimension] = thinned
+    if dimension == spec['model']['x_axis']:
+        candidates, model_start, model_end = x_axis_bounds
+        spec['model']['model_start'], spec['model']['model_end'] = \
+            model_bounds(candidates, thinned, model_start, model_end)
+        if 'adaptive' in spec:
+            spec['adaptive']['rounds'] = [thinned]
+
+
+def fit_budget(spec, budget):
+    '''
+    thins the scale dimensions until the estimated time fits into budget
+    seconds, secondary dimensions first and the x axis last
+    '''
+    x_axis = spec['model']['x_axis']
+    if 'adaptive' in spec:
+        x_axis_bounds = (spec['adaptive']['candidates'], spec['adaptive']['model_start'], spec['adaptive']['model_end'])
+    else:
+        x_axis_bounds = (list(_values(spec, x_axis)), spec['model']['model_start'], spec['model']['model_end'])
+
+    while estimate(spec)['total'] > budget:
+        dimensions = [dimension for dimension in spec['metrics']['scale'] if len(_values(spec, dimension)) > 1]
+        if not dimensions:
+            log.error('Experiment does not fit into %s even with a single loop point', _hours(budget))
+            return False
+        # thin before dropping values, secondary dimensions before the x axis
+        dimension = max(dimensions, key=lambda d: (len(_values(spec, d)) > 2, d != x_axis, len(_values(spec, d))))
+        _thin(spec, dimension, x_axis_bounds)
+    log.info('Estimated time %s fits into budget of %s', _hours(estimate(spec)['total']), _hours(budget))
+    return True
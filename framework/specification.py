@@ -5,6 +5,18 @@ import sys
 import os
 import logging as log
 
+from framework.adaptive import coarse_grid, model_bounds
+from framework.topology import dut_cores
+
+
+# how t4p4s updates its tables, see dpdk_lib_change_tables.c
+TABLE_MODES = ['replica', 'rcu']
+# inter-arrival times of the latency load and table entries of the packets
+PATTERNS = ['cbr', 'poisson', 'burst']
+KEY_DISTRIBUTIONS = ['uniform', 'zipf', 'hot_set']
+# simple IMIX, packet sizes (incl. crc) and their share
+IMIX = [(64, 7), (576, 4), (1500, 1)]
+
 
 def _get_table_scaling():
     tens = range(8)
@@ -48,6 +60,29 @@ def _get_default_program_args():
     }
 
 
+def _get_generator(node_config):
+    '''
+    tx ports and load queues of the loadgen, each load queue is served by a
+    MoonGen task on its own core
+    '''
+    loadgen = node_config['loadgen']
+    tx = loadgen['port']['tx']
+    ports = tx if isinstance(tx, list) else [tx]
+    cores = loadgen.get('tx_cores', 4)
+    if cores < len(ports):
+        log.error('Loadgen needs at least one tx core per tx port, got %d for %d ports', cores, len(ports))
+        sys.exit(6)
+    if cores % len(ports):
+        # every tx port gets the same number of load queues
+        log.warning('Loadgen uses %d of %d tx cores, %d per tx port',
+                    cores - cores % len(ports), cores, cores // len(ports))
+    return {
+        'tx_ports': ports,
+        'tx_queues': cores // len(ports),
+        'speed': loadgen.get('speed', 10),  # in gbit/s per tx port
+    }
+
+
 def generate(args):
     log.info('Generate specification')
     spec = {}
@@ -76,24 +111,62 @@ def generate(args):
         spec['metrics']['perf'] = perf_stat
     elif args.target == 'p4_nfp':
         m.append('resources')
+    if args.zero_loss is not None:
+        m.append('zero_loss')
     spec['metrics']['names'] = m
+    if args.latency_digits is not None:
+        # log-linear latency histograms with interval snapshots instead of one flat histogram
+        spec['metrics']['latency_recorder'] = {
+            'digits': args.latency_digits,
+            'probe_rate': args.probe_rate,  # in probes per second, 0 is back to back
+            'interval': args.latency_interval,  # in seconds
+        }
 
     # what should scale for the experiment series
     s = {}
     if args.target == 'p4_t4p4s':
         # for software targets we can scale cpu cores
-        s['cpu_cores'] = [1, 2, 3, 4] + [len(args.node_config['dut']['cores'])]
+        s['cpu_cores'] = [1, 2, 3, 4] + [len(dut_cores(args.node_config['dut']))]
     spec['metrics']['scale'] = s
 
     ### traffic
     t = {}
-    t['pattern'] = 'cbr'
+    t['pattern'] = args.pattern
+    if args.pattern == 'burst':
+        t['burst_size'] = args.burst_size   # packets back to back at line rate
+    t['keys'] = {
+        'distribution': args.keys,
+    }
+    if args.keys == 'zipf':
+        t['keys']['s'] = args.zipf_s
+    elif args.keys == 'hot_set':
+        t['keys']['hot_fraction'], t['keys']['hot_share'] = args.hot_set
+    t['imix'] = args.imix
+    t['generator'] = _get_generator(args.node_config)
     t['load'] = {
-        'max': '10', # in gbit/s
+        'max': str(t['generator']['speed'] * len(t['generator']['tx_ports'])),  # in gbit/s
         'latency': [0.1, 0.5, 0.7], # percentages of max load
     }
     t['packet_size'] = [64, 128, 256, 512, 1024, 1500]
     t['payload_u32_offset'] = 0
+    if args.zero_loss is not None:
+        # RFC 2544 throughput, binary search of the offered rate
+        t['zero_loss'] = {
+            'loss': args.zero_loss,
+            'trial': 5,         # in seconds
+            'precision': 0.01,  # of the upper bound
+            'max_trials': 12,
+        }
+    # resend a ring of precomputed packets instead of rewriting every packet
+    t['packet_ring'] = args.packet_ring
+    if args.packet_ring and (args.pattern != 'cbr' or args.keys != 'uniform' or args.imix):
+        log.error('The packet ring only resends cbr traffic of one size with round-robin table entries')
+        sys.exit(6)
+    if args.sweep_in_process:
+        # step through the packet sizes and latency rates in one MoonGen process
+        t['sweep'] = {
+            'settle': 2,        # in seconds, before each step
+        }
     if isinstance(t['packet_size'], list):
         # add also to scaling variables
         spec['metrics']['scale']['packet_size'] = t['packet_size']
@@ -108,6 +181,7 @@ def generate(args):
     }
     if args.target == 'p4_t4p4s':
         spec['program']['target'] = 't4p4s'
+        spec['program']['table_mode'] = args.table_mode
 
     ## model
     spec['model'] = {
@@ -499,7 +573,39 @@ def generate(args):
     spec['meta']['feature'] = experiment_name
     spec['meta']['outdir'] = outdir
     spec['meta']['max_load_repetitions'] = args.max_load_repetitions
+    # fewer repetitions once the max load results converged
+    spec['meta']['min_load_repetitions'] = min(args.min_load_repetitions or args.max_load_repetitions,
+                                               args.max_load_repetitions)
+    spec['meta']['target_ci'] = args.target_ci
+    # in seconds
+    spec['meta']['duration'] = {
+        'max_load': 10,
+        'latency': 60,
+    }
 
     spec['model']['x_axis'] = x_axis
+
+    # the size mix replaces the packet sizes, rates are converted with its mean size
+    if spec['traffic']['imix']:
+        mean = round(sum(size * share for size, share in IMIX) / sum(share for _, share in IMIX))
+        spec['traffic']['packet_size'] = mean
+        if 'packet_size' in spec['metrics']['scale']:
+            spec['metrics']['scale']['packet_size'] = [mean]
+
+    # adaptive sweep, start with a coarse grid and refine where the model bends
+    if args.adaptive and x_axis in spec['metrics']['scale']:
+        candidates = spec['metrics']['scale'][x_axis]
+        points = coarse_grid(candidates, args.adaptive)
+        log.info('Adaptive sweep starting with %d of %d points', len(points), len(candidates))
+        spec['adaptive'] = {
+            'candidates': candidates,
+            'model_start': spec['model']['model_start'],
+            'model_end': spec['model']['model_end'],
+            'rounds': [points],
+        }
+        spec['metrics']['scale'][x_axis] = points
+        spec['model']['model_start'], spec['model']['model_end'] = \
+            model_bounds(candidates, points, spec['model']['model_start'], spec['model']['model_end'])
+
     spec['node_config'] = args.node_config
     return spec
@@ -0,0 +1,81 @@
+'''
+table entries of a program: sizes of the t4p4s tables and binary bulk-load
+files for the DuT control plane
+
+Layout of a bulk-load file (little endian):
+    header      magic 'P4BL', u16 version, u16 number of tables
+    per table   u32 table id, u8 match type, u8 key size, u16 record size,
+                u64 number of entries, u64 offset of the first record
+    records     fixed-width key, followed by the depth (u8) for lpm or the
+                mask (key size bytes) for ternary
+'''
+
+
+import math
+import struct
+import logging as log
+import numpy as np
+
+
+MAGIC = b'P4BL'
+VERSION = 1
+MATCH_TYPES = {
+    'exact': 0,
+    'lpm': 1,
+    'ternary': 2,
+}
+HEADER = struct.Struct('<4sHH')
+TABLE = struct.Struct('<IBBHQQ')
+
+
+def table_size(entries, load_factor=0.75, minimum=1000):
+    '''
+    HASH_ENTRIES/TABLE_MAX for a table of entries, with headroom for the
+    load factor of the hash table (rte_hash rounds up to a power of two)
+    '''
+    return max(minimum, math.ceil(entries / load_factor))
+
+
+def key_size(number_match_keys, match_key_size):
+    return number_match_keys * ((match_key_size + 7) // 8)
+
+
+def records(entries, match_type, size):
+    # low bytes of the entry index, as the loadgen writes its table entry counter
+    dtype = '<u4' if entries <= 2 ** 32 else '<u8'
+    index = np.arange(entries, dtype=dtype).view(np.uint8).reshape(entries, -1)
+    if size <= index.shape[1]:
+        keys = index[:, :size]
+    else:
+        keys = np.hstack([index, np.zeros((entries, size - index.shape[1]), dtype=np.uint8)])
+    columns = [keys]
+    if match_type == 'lpm':
+        columns.append(np.full((entries, 1), min(size * 8, 255), dtype=np.uint8))
+    elif match_type == 'ternary':
+        columns.append(np.full((entries, size), 0xff, dtype=np.uint8))
+    return np.ascontiguousarray(np.hstack(columns))
+
+
+def bulk_file(tables, entries, match_type, size):
+    '''
+    content of a bulk-load file with the same entries in every table, at most
+    one entry per key
+    '''
+    if match_type not in MATCH_TYPES:
+        raise ValueError('Unsupported match type {}'.format(match_type))
+    # further entries would repeat the keys of the first ones
+    if size < 8 and entries > 2 ** (8 * size):
+        log.warning('%d table entries exceed the %d keys of %d byte keys, loading %d entries',
+                    entries, 2 ** (8 * size), size, 2 ** (8 * size))
+        entries = 2 ** (8 * size)
+    data = records(entries, match_type, size)
+    record_size = data.shape[1]
+    # all tables share the records
+    offset = HEADER.size + TABLE.size * tables
+    content = [HEADER.pack(MAGIC, VERSION, tables)]
+    for table in range(tables):
+        content.append(TABLE.pack(table, MATCH_TYPES[match_type], size, record_size, entries, offset))
+    content.append(data.tobytes())
+    log.debug('bulk-load file with %d tables of %d %s entries (%d bytes per record)',
+              tables, entries, match_type, record_size)
+    return b''.join(content)
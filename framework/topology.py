@@ -0,0 +1,136 @@
+'''
+core selection of the DuT from the cpu topology in its node config
+
+    topology:
+            sockets:        logical cpus per socket
+            siblings:       groups of logical cpus sharing a physical core
+            port_sockets:   socket each port is attached to
+            housekeeping:   cpus left to the kernel, optional (default: the lowest
+                            cpu not in the DuT cores, or else of them)
+'''
+
+
+import logging as log
+
+
+# boot parameters of node configs without topology
+DEFAULT_ISOLATION = ['isolcpus=0-6']
+
+
+def cpu_list(cpus):
+    '''
+    kernel cpu list of cpus, e.g. 0-3,8
+    '''
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(low) if low == high else '{}-{}'.format(low, high) for low, high in ranges)
+
+
+def _socket_of(topology):
+    return {cpu: socket for socket, cpus in topology['sockets'].items() for cpu in cpus}
+
+
+def _siblings_of(topology):
+    siblings = {}
+    for group in topology.get('siblings', []):
+        for cpu in group:
+            siblings[cpu] = [sibling for sibling in group if sibling != cpu]
+    return siblings
+
+
+def _housekeeping(dut):
+    topology = dut['topology']
+    cpus = set(_socket_of(topology))
+    # nohz_full needs at least one cpu for the kernel, taken from the DuT cores if they cover all
+    return set(topology.get('housekeeping') or [min(cpus - set(dut.get('cores') or []) or cpus)])
+
+
+def dut_cores(dut):
+    '''
+    cores of the DuT available to t4p4s, all but the housekeeping cpus
+    '''
+    topology = dut.get('topology')
+    if not topology:
+        return list(dut['cores'])
+    housekeeping = _housekeeping(dut)
+    return [cpu for cpu in dut.get('cores') or sorted(_socket_of(topology)) if cpu not in housekeeping]
+
+
+def order_cores(dut, ports):
+    '''
+    cores of the DuT in the order they are added when scaling cpu_cores:
+    physical cores local to the ports first, then remote ones, then their
+    SMT siblings, local ones first; never the housekeeping cpus
+    '''
+    topology = dut.get('topology')
+    if not topology:
+        return list(dut['cores'])
+    socket_of = _socket_of(topology)
+    siblings = _siblings_of(topology)
+    port_sockets = [topology['port_sockets'][port] for port in ports if port in topology.get('port_sockets', {})]
+    local = max(set(port_sockets), key=port_sockets.count) if port_sockets else None
+    if len(set(port_sockets)) > 1:
+        log.warning('DuT ports are attached to sockets %s, preferring socket %s', sorted(set(port_sockets)), local)
+
+    candidates = dut_cores(dut)
+    physical = []
+    smt = []
+    for cpu in candidates:
+        # the first candidate of a physical core runs on it, the others are siblings
+        if any(sibling in physical for sibling in siblings.get(cpu, [])):
+            smt.append(cpu)
+        else:
+            physical.append(cpu)
+
+    def remote(cpu):
+        return socket_of.get(cpu) != local
+    ordered = sorted(physical, key=remote) + sorted(smt, key=remote)
+    local_physical = len([cpu for cpu in physical if not remote(cpu)])
+    if local_physical < len(ordered):
+        log.warning('Only the first %d of %d DuT cores are port-local physical cores', local_physical, len(ordered))
+    log.info('DuT core order %s', ','.join(str(cpu) for cpu in ordered))
+    return ordered
+
+
+def port_queues(dut, ports, cores):
+    '''
+    (port, queue, core) of the t4p4s config, every core serves the queues of
+    the ports on its socket, cores and ports without a local counterpart are
+    served by and serve all
+    '''
+    topology = dut.get('topology') or {}
+    socket_of = _socket_of(topology) if topology else {}
+    port_sockets = topology.get('port_sockets', {})
+
+    def local(core, port):
+        return port in port_sockets and socket_of.get(core) == port_sockets[port]
+    cpq = []
+    queues = {port: 0 for port in ports}
+    for core in cores:
+        for port in ports:
+            if local(core, port) or not any(local(core, other) for other in ports) or \
+                    not any(local(other, port) for other in cores):
+                cpq.append((port, queues[port], core))
+                queues[port] += 1
+    return cpq
+
+
+def isolation_parameters(dut, cores):
+    '''
+    kernel boot parameters keeping the housekeeping off the cores and their
+    idle SMT siblings
+    '''
+    topology = dut.get('topology')
+    if not topology:
+        return list(DEFAULT_ISOLATION)
+    siblings = _siblings_of(topology)
+    housekeeping = _housekeeping(dut)
+    isolated = set(cores) | set(sibling for cpu in cores for sibling in siblings.get(cpu, []))
+    if isolated & housekeeping:
+        log.warning('Not isolating DuT cores %s for housekeeping', cpu_list(isolated & housekeeping))
+    isolated = cpu_list(isolated - housekeeping)
+    return ['isolcpus={}'.format(isolated), 'nohz_full={}'.format(isolated), 'rcu_nocbs={}'.format(isolated)]
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import argparse
+import logging as log
+import yaml
+from pprint import pformat
+from concurrent.futures import ThreadPoolExecutor
+
+from framework.specification import generate as generate_specification
+from framework.experiment import generate as generate_experiment
+from framework.p4gen16 import Generator
+from generate_component_benchmark import argument_parser as experiment_argument_parser, \
+    add_generation_arguments, create_cache, load_node_config, LOG_FORMAT
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser('Generate all experiments of a benchmark suite in one process')
+    parser.add_argument('manifest',
+                        help='suite manifest (YAML) listing target, testbed, component and feature per experiment')
+    add_generation_arguments(parser)
+    return parser.parse_args()
+
+
+def experiment_arguments(manifest, entry):
+    # reuse the command line of generate_component_benchmark.py for every entry
+    argv = [
+        '--test-nodes', entry.get('test_nodes', manifest.get('test_nodes')),
+        '--max-load-repetitions', str(entry.get('max_load_repetitions', manifest.get('max_load_repetitions', 3))),
+        entry.get('target', manifest.get('target')),
+        entry.get('testbed', manifest.get('testbed')),
+        entry.get('outdir', manifest.get('outdir')),
+        entry['component'],
+        '--' + entry['feature'].replace('_', '-'),
+    ]
+    # optional settings, per entry or for the whole suite
+    for key in ['min_load_repetitions', 'target_ci', 'table_mode']:
+        value = entry.get(key, manifest.get(key))
+        if value is not None:
+            argv[:0] = ['--' + key.replace('_', '-'), str(value)]
+    args = experiment_argument_parser(argv)
+    args.node_config = load_node_config(args.test_nodes)
+    return args
+
+
+def generate_suite_experiments(specs, jobs, cache, generator, shared_evaluation):
+    # experiments sharing an output directory are generated one after another
+    timings = []
+    for spec in specs:
+        start = time.perf_counter()
+        generate_experiment(spec, jobs=jobs, cache=cache, generator=generator,
+                            shared_evaluation=shared_evaluation)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def print_timings(results):
+    rows = [('experiment', 'programs', 'time [s]')]
+    for name, spec, elapsed in results:
+        if elapsed is None:
+            rows.append((name, '-', 'failed'))
+            continue
+        scale = spec['program']['scale']
+        programs = len(spec['metrics']['scale'][scale['with']]) if scale else 1
+        rows.append((name, str(programs), '{:.2f}'.format(elapsed)))
+    widths = [max(len(row[i]) for row in rows) for i in range(3)]
+    for row in rows:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)))
+
+
+def main():
+    args = argument_parser()
+
+    # logger
+    log.basicConfig(
+        level=log.DEBUG,
+        format=LOG_FORMAT
+    )
+
+    with open(args.manifest) as fh:
+        manifest = yaml.safe_load(fh.read())
+
+    ## gather configs
+    start = time.perf_counter()
+    results = []
+    outdirs = {}
+    for entry in manifest['experiments']:
+        name = '/'.join([entry.get('target', manifest.get('target')), entry['component'], entry['feature']])
+        try:
+            spec = generate_specification(experiment_arguments(manifest, entry))
+        except (Exception, SystemExit) as e:
+            log.error('Invalid experiment %s: %s', name, e)
+            results.append((name, None, None))
+            continue
+        log.debug(pformat(spec))
+        outdirs.setdefault(spec['meta']['outdir'], []).append((name, spec))
+
+    ## create files, sharing template environments, cache and generator
+    cache = create_cache(args)
+    generator = Generator(args.p4gen16, jobs=args.jobs)
+    # every experiment generates its programs in a pool of its own, divide the jobs among them
+    workers = max(1, min(args.jobs, len(outdirs)))
+    jobs = max(1, args.jobs // workers)
+    log.info('Generating %d output directories in parallel with %d jobs each', workers, jobs)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(experiments, executor.submit(generate_suite_experiments, [spec for _, spec in experiments],
+                                                     jobs, cache, generator, args.shared_evaluation))
+                       for experiments in outdirs.values()]
+            for experiments, future in futures:
+                try:
+                    timings = future.result()
+                except (Exception, SystemExit) as e:
+                    log.error('Generating experiments in %s failed: %s', experiments[0][1]['meta']['outdir'], e)
+                    timings = [None] * len(experiments)
+                for (name, spec), elapsed in zip(experiments, timings):
+                    results.append((name, spec, elapsed))
+    finally:
+        generator.shutdown()
+    if cache:
+        cache.log_statistics()
+    generator.log_statistics()
+
+    print_timings(results)
+    print('total: {:.2f} s'.format(time.perf_counter() - start))
+
+    if any(elapsed is None for _, _, elapsed in results):
+        sys.exit(1)
+    log.info('Done')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,26 @@
 #!/usr/bin/env python3
 
 import os
+import sys
 import argparse
 import logging as log
 import pathlib
 import glob
+import copy
+import functools
 import yaml
 from pprint import pformat
 
-from framework.specification import generate as generate_specification
+from framework.specification import generate as generate_specification, TABLE_MODES, PATTERNS, KEY_DISTRIBUTIONS
 from framework.experiment import generate as generate_experiment
+from framework.cache import PlaneCache, p4gen16_revision
+from framework.p4gen16 import Generator, MODES as P4GEN16_MODES
+from framework.planning import print_estimate, fit_budget
 
 
 BASEPATH = pathlib.Path(__file__).parent.absolute()
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                         'component_modeling_framework', 'p4gen16')
 
 
 TARGETS = [
@@ -33,7 +41,46 @@ TESTBEDS = [
 LOG_FORMAT = '[%(levelname)s] %(message)s'
 
 
-def argument_parser():
+@functools.lru_cache(maxsize=None)
+def node_configs():
+    return [os.path.splitext(name.split('/')[-1])[0]
+            for name in glob.glob(os.path.join(BASEPATH, 'node_config/*.yml'))]
+
+
+@functools.lru_cache(maxsize=None)
+def _read_node_config(name):
+    with open(os.path.join(BASEPATH, 'node_config', name + '.yml')) as fh:
+        return yaml.safe_load(fh.read())
+
+
+def load_node_config(name):
+    # every specification gets its own copy
+    return copy.deepcopy(_read_node_config(name))
+
+
+def add_generation_arguments(parser):
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='number of P4 programs to generate in parallel (default: number of cores)')
+    parser.add_argument('--p4gen16', type=str, choices=P4GEN16_MODES, default='library',
+                        help='run p4gen16 in-process (library) or one interpreter per program (subprocess)')
+    parser.add_argument('--cache-dir', type=str, default=CACHE_DIR,
+                        help='directory of the generated P4 program cache')
+    parser.add_argument('--cache-size', type=int, default=1024,
+                        help='maximum size of the P4 program cache in MiB')
+    parser.add_argument('--no-cache', default=False, action='store_true',
+                        help='always run p4gen16, do not use the P4 program cache')
+    parser.add_argument('--shared-evaluation', type=str, default=None,
+                        help='share the evaluation code in this directory, only templated files are private')
+
+
+def create_cache(args):
+    if args.no_cache:
+        return None
+    return PlaneCache(args.cache_dir, args.cache_size * 1024 * 1024,
+                      p4gen16_revision(os.path.join(BASEPATH, 'deps', 'p4gen16')))
+
+
+def argument_parser(argv=None):
     parser = argparse.ArgumentParser('Generate experiment configuration for benchmarking a component')
     parser.add_argument('target', type=str, choices=TARGETS,
                         help='the device target')
@@ -44,11 +91,53 @@ def argument_parser():
 
     # options
     parser.add_argument('--test-nodes', metavar='LG_DUT', type=str,
-                        choices=[os.path.splitext(name.split('/')[-1])[0]
-                                 for name in glob.glob(os.path.join(BASEPATH, 'node_config/*.yml'))],
+                        choices=node_configs(),
                         help='configuration regarding the pair of nodes for this experiment (node_config/LG_DUT.yml)')
     parser.add_argument('--max-load-repetitions', type=int, default=3,
                         help='repetitions of max load measurement')
+    parser.add_argument('--min-load-repetitions', type=int, default=None,
+                        help='stop after this many max load repetitions once they converged '
+                             '(default: always run --max-load-repetitions)')
+    parser.add_argument('--target-ci', type=float, default=0.02,
+                        help='relative 95%% confidence interval of the max load at which repetitions converged')
+    parser.add_argument('--adaptive', metavar='POINTS', type=int, default=None,
+                        help='measure only POINTS of the x axis first, refine with refine_experiment.py')
+    parser.add_argument('--estimate', default=False, action='store_true',
+                        help='print the estimated testbed time and exit')
+    parser.add_argument('--budget', metavar='HOURS', type=float, default=None,
+                        help='thin the scale dimensions until the estimated testbed time fits')
+    parser.add_argument('--zero-loss', metavar='LOSS', type=float, default=None,
+                        help='search the highest rate with a loss ratio below LOSS, '
+                             'the latency is then measured relative to it')
+    parser.add_argument('--sweep-in-process', default=False, action='store_true',
+                        help='step through the packet sizes and latency rates in one MoonGen process '
+                             'instead of relaunching it per pos loop point')
+    parser.add_argument('--packet-ring', default=False, action='store_true',
+                        help='precompute the packets of all flows and table entries once per loadgen queue '
+                             'and only resend them, keeping the loadgen CPU out of the bottleneck')
+    parser.add_argument('--pattern', type=str, choices=PATTERNS, default='cbr',
+                        help='inter-arrival times of the latency load, poisson or on/off bursts at line rate')
+    parser.add_argument('--burst-size', type=int, default=32,
+                        help='packets per burst of --pattern burst')
+    parser.add_argument('--keys', type=str, choices=KEY_DISTRIBUTIONS, default='uniform',
+                        help='distribution of the table entries over the packets, uniform is round-robin')
+    parser.add_argument('--zipf-s', type=float, default=1.0,
+                        help='exponent of --keys zipf')
+    parser.add_argument('--hot-set', metavar=('FRACTION', 'SHARE'), type=float, nargs=2, default=[0.2, 0.8],
+                        help='SHARE of the packets match the FRACTION of the table entries with --keys hot_set')
+    parser.add_argument('--imix', default=False, action='store_true',
+                        help='send the simple IMIX size mix instead of the packet sizes')
+    parser.add_argument('--latency-digits', type=int, choices=[1, 2, 3, 4], default=None,
+                        help='record latencies in log-linear buckets of this many significant digits, '
+                             'with interval snapshots and a percentile summary')
+    parser.add_argument('--probe-rate', type=float, default=0,
+                        help='timestamped probes per second with --latency-digits, 0 sends them back to back')
+    parser.add_argument('--latency-interval', type=float, default=1,
+                        help='seconds per latency snapshot with --latency-digits')
+    parser.add_argument('--table-mode', type=str, choices=TABLE_MODES, default='replica',
+                        help='replica: update a copy of each table and swap (t4p4s default), '
+                             'rcu: update a single copy in place with quiescent-state-based reclamation')
+    add_generation_arguments(parser)
     # TODO metrics
 
     # ### different components
@@ -103,7 +192,11 @@ def argument_parser():
                              help='scale number of header field writes')
     group_other.add_argument('--number-of-meta-field-writes', default=False, action='store_true',
                              help='scale number of meta field writes')
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+    # the coarse grid always contains both ends of the x axis
+    if args.adaptive is not None and args.adaptive < 2:
+        parser.error('--adaptive needs at least 2 POINTS')
+    return args
 
 
 def main():
@@ -119,15 +212,29 @@ def main():
     )
 
     # load node config
-    with open(os.path.join(BASEPATH, 'node_config', args.test_nodes + '.yml')) as fh:
-        args.node_config = yaml.safe_load(fh.read())
+    args.node_config = load_node_config(args.test_nodes)
 
     ## gather configs
     spec = generate_specification(args)
+    if args.budget and not fit_budget(spec, args.budget * 3600):
+        sys.exit(1)
     log.info(pformat(spec))
 
+    if args.estimate:
+        print_estimate(spec)
+        return
+
     ## create files
-    generate_experiment(spec)
+    cache = create_cache(args)
+    generator = Generator(args.p4gen16, jobs=args.jobs)
+    try:
+        generate_experiment(spec, jobs=args.jobs, cache=cache, generator=generator,
+                            shared_evaluation=args.shared_evaluation)
+    finally:
+        generator.shutdown()
+    if cache:
+        cache.log_statistics()
+    generator.log_statistics()
 
     log.info('Done')
 
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import csv
+import argparse
+import statistics
+import logging as log
+import yaml
+
+from framework.adaptive import refine, model_bounds
+from framework.experiment import generate
+from framework.p4gen16 import Generator
+from generate_component_benchmark import add_generation_arguments, create_cache, LOG_FORMAT
+
+
+def argument_parser():
+    parser = argparse.ArgumentParser('Add scale points to an adaptive experiment where the measured curve bends')
+    parser.add_argument('experiment',
+                        help='experiment directory generated with --adaptive')
+    parser.add_argument('measurements',
+                        help='CSV file with a column named after the x axis and the measured value, '
+                             'optionally with the plot_per columns (e.g. packet_size)')
+    parser.add_argument('--value', type=str, default='value',
+                        help='column of the measured throughput/cycles value')
+    parser.add_argument('--tolerance', type=float, default=0.02,
+                        help='relative deviation from the model that requires more points')
+    add_generation_arguments(parser)
+    return parser.parse_args()
+
+
+def read_measurements(filename, x_axis, value, plot_per):
+    # median per x axis value, separately for every plot_per combination
+    groups = {}
+    with open(filename) as fh:
+        for row in csv.DictReader(fh):
+            group = tuple(row.get(key) for key in plot_per)
+            groups.setdefault(group, {}).setdefault(float(row[x_axis]), []).append(float(row[value]))
+    return {group: {x: statistics.median(values) for x, values in measured.items()}
+            for group, measured in groups.items()}
+
+
+def main():
+    args = argument_parser()
+
+    # logger
+    log.basicConfig(
+        level=log.DEBUG,
+        format=LOG_FORMAT
+    )
+
+    with open(os.path.join(args.experiment, 'specification.yml')) as fh:
+        spec = yaml.safe_load(fh.read())
+    if 'adaptive' not in spec:
+        log.error('Experiment was not generated with --adaptive')
+        sys.exit(1)
+    spec['meta']['outdir'] = args.experiment
+
+    adaptive = spec['adaptive']
+    x_axis = spec['model']['x_axis']
+    candidates = adaptive['candidates']
+    measured_points = [point for points in adaptive['rounds'] for point in points]
+    # measurements are read as floats, map back to the candidates
+    by_value = {float(candidate): candidate for candidate in candidates}
+
+    new = set()
+    measurements = read_measurements(args.measurements, x_axis, args.value, spec['model']['plot_per'])
+    for group, measured in measurements.items():
+        measured = {by_value[x]: y for x, y in measured.items() if x in by_value}
+        log.info('Refining %s for %s', x_axis, ', '.join(str(key) for key in group if key is not None) or 'all')
+        new.update(refine(candidates, measured, spec['model']['model_max_parts'],
+                          log_scale=spec['model']['log_scale'], tolerance=args.tolerance))
+    new = [point for point in candidates if point in new and point not in measured_points]
+    if not new:
+        log.info('Converged after %d rounds with %d of %d points',
+                 len(adaptive['rounds']), len(measured_points), len(candidates))
+        return
+
+    log.info('Round %d: adding %s', len(adaptive['rounds']) + 1, ', '.join(str(point) for point in new))
+    adaptive['rounds'].append(new)
+    spec['metrics']['scale'][x_axis] = new
+    spec['model']['model_start'], spec['model']['model_end'] = \
+        model_bounds(candidates, sorted(measured_points + new, key=candidates.index),
+                     adaptive['model_start'], adaptive['model_end'])
+
+    ## regenerate the experiment for the new points, only changed files are written
+    cache = create_cache(args)
+    generator = Generator(args.p4gen16, jobs=args.jobs)
+    try:
+        generate(spec, jobs=args.jobs, cache=cache, generator=generator,
+                 shared_evaluation=args.shared_evaluation)
+    finally:
+        generator.shutdown()
+    if cache:
+        cache.log_statistics()
+    generator.log_statistics()
+
+    log.info('Done')
+
+
+if __name__ == '__main__':
+    main()
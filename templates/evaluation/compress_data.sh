@@ -18,6 +18,7 @@ cd ${PARENT_DIR}
 
 set +x
 tar --zstd -cf ${EXP_DIR}.tar.zst ${EXP_DIR}/cesis/perf*.stderr \
+	${EXP_DIR}/cesis/perf_stat.csv_* \
 	${EXP_DIR}/nida/throughput* \
 	${EXP_DIR}/nida/histogram* \
 	${EXP_DIR}/cesis/*.loop \
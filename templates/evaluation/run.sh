@@ -1,6 +1,12 @@
 #!/bin/bash
 
 source venv/bin/activate
+# perf stat counts of runs whose events were multiplexed and scaled by perf
+RESULT_DIR=${1:-$( tail -n 1 ../result_directory.txt )}
+awk -F, 'FNR > 1 && $6 == 1 { print FILENAME "," $0 }' ${RESULT_DIR}/{{ dut }}/perf_stat.csv_* 2>/dev/null > multiplexed_perf_stat.csv
+if [[ -s multiplexed_perf_stat.csv ]]; then
+	echo "WARNING: $(wc -l < multiplexed_perf_stat.csv) perf stat counts were multiplexed, see multiplexed_perf_stat.csv" | tee -a evaluation.log
+fi
 python3 plot_perf_stat.py "$@" 2>&1 | tee -a evaluation.log
 python3 plot_throughput.py "$@" 2>&1 | tee -a evaluation.log
 make
@@ -18,23 +18,62 @@ local function getRstFile(...)
 	return nil, nil
 end
 
+{% set paced = pattern != 'cbr' %}
+{% include 'moongen/lua/shared/load.lua' %}
+
 function configure(parser)
 	parser:description("Generates bidirectional CBR traffic with hardware rate control and measure latencies.")
-	parser:argument("dev1", "Device to transmit/receive from."):convert(tonumber)
+	parser:argument("dev1", "Devices to transmit from, comma-separated, the first one also sends the timestamped packets.")
 	parser:argument("dev2", "Device to transmit/receive from."):convert(tonumber)
-	parser:option("-r --rate", "Transmit rate in Mbit/s."):default(10000):convert(tonumber)
+	parser:option("-r --rate", "Transmit rate in Mbit/s."):default({{ max_rate }}):convert(tonumber)
 	parser:option("-p --pktrate", "Transmit rate in pps."):default(0):convert(tonumber)
 	parser:option("-s --pktsize", "Packetsize in bytes (incl. crc)."):default(64):convert(tonumber)
 	parser:option("-f --file", "Filename of the latency histogram."):default("histogram.csv")
 	parser:option("-f --flows", "Number of different IPs to use."):default(100):convert(tonumber)
 	parser:option("-t --table-entries", "Number of different table entries."):default(4):convert(tonumber)
+	parser:option("--steps", "Comma-separated SIZE:PPS:TAG steps to go through in one process."):default("")
+	parser:option("--duration", "Measurement time per step in seconds."):default(60):convert(tonumber)
+	parser:option("--settle", "Time before the measurement of each step in seconds."):default(2):convert(tonumber)
+end
+
+-- one step per packet size and rate, counters and histograms are written to files tagged with TAG
+local function sweep(txDevs, txQueues, dev2, args)
+	for size, pktrate, tag in string.gmatch(args.steps, "([^:,]+):([^:,]+):([^:,]+)") do
+		local pktsize = math.max(tonumber(size), 64)
+		local rate = (tonumber(pktrate) * pktsize * 8) / 1000000 / #txQueues
+		local stopTime = mg.getTime() + args.settle + args.duration
+		local tasks = {}
+		for _, queue in ipairs(txQueues) do
+{% if pattern == 'cbr' %}
+			queue:setRate(rate)
+			table.insert(tasks, mg.startTask("loadSlave", queue, pktsize, args.flows, args.table_entries, stopTime))
+{% else %}
+			table.insert(tasks, mg.startTask("loadSlave", queue, pktsize, args.flows, args.table_entries, stopTime, tonumber(pktrate) / #txQueues))
+{% endif %}
+		end
+		mg.sleepMillis(math.floor(args.settle * 1000))
+		table.insert(tasks, mg.startTask("txrxCounterSlave", txDevs, dev2, "-" .. tag, stopTime))
+		table.insert(tasks, mg.startSharedTask("timerSlave", txDevs[1]:getTxQueue(TX_QUEUES), dev2:getRxQueue(1), "histogram-" .. tag .. ".csv", stopTime))
+		for _, task in ipairs(tasks) do
+			task:wait()
+		end
+		if not mg.running() then
+			break
+		end
+	end
 end
 
 function master(args)
-	local dev1 = device.config({port = args.dev1, txQueues = 5})
+	-- one more queue for the timestamped packets
+	local txDevs, txQueues = configureTx(args.dev1, 1)
 	local dev2 = device.config({port = args.dev2, rxQueues = 2})
 	device.waitForLinks()
 
+	if args.steps ~= "" then
+		sweep(txDevs, txQueues, dev2, args)
+		return
+	end
+
 	pktsize = args.pktsize
 	if args.pktsize < 64 then
 		pktsize = 64
@@ -44,72 +83,227 @@ function master(args)
 	if args.pktrate > 0 then
 		rate = (args.pktrate * (pktsize) * 8) / 1000000
 	end
-	rate = rate / 4
-	dev1:getTxQueue(0):setRate(rate)
-	dev1:getTxQueue(1):setRate(rate)
-	dev1:getTxQueue(2):setRate(rate)
-	dev1:getTxQueue(3):setRate(rate)
+	rate = rate / #txQueues
+{% if pattern == 'cbr' %}
+	for _, queue in ipairs(txQueues) do
+		queue:setRate(rate)
+	end
+{% endif %}
 
-	mg.startTask("txrxCounterSlave", dev1, dev2)
+	mg.startTask("txrxCounterSlave", txDevs, dev2)
 
-	mg.startTask("loadSlave", dev1:getTxQueue(0), pktsize, args.flows, args.table_entries)
-	mg.startTask("loadSlave", dev1:getTxQueue(1), pktsize, args.flows, args.table_entries)
-	mg.startTask("loadSlave", dev1:getTxQueue(2), pktsize, args.flows, args.table_entries)
-	mg.startTask("loadSlave", dev1:getTxQueue(3), pktsize, args.flows, args.table_entries)
+	for _, queue in ipairs(txQueues) do
+{% if pattern == 'cbr' %}
+		mg.startTask("loadSlave", queue, pktsize, args.flows, args.table_entries)
+{% else %}
+		mg.startTask("loadSlave", queue, pktsize, args.flows, args.table_entries, false, rate * 1000000 / (pktsize * 8))
+{% endif %}
+	end
 
-	mg.startSharedTask("timerSlave", dev1:getTxQueue(4), dev2:getRxQueue(1), args.file)
+	mg.startSharedTask("timerSlave", txDevs[1]:getTxQueue(TX_QUEUES), dev2:getRxQueue(1), args.file)
 	mg.waitForTasks()
 end
 
-function loadSlave(txQueue, pktsize, flows, table_entries)
-	local baseIP = parseIPAddress("10.0.0.1")
-	local mem = memory.createMemPool(function(buf)
-		buf:getIP4Packet():fill{ 
-			ethSrc = queue,
-			ethDst = "12:34:56:78:9a:bc",
-			pktLength = pktsize
-		}
-	end)
-	local bufs = mem:bufArray()
-	local counter = 0
-	local te_counter = 0
-	while mg.running() do
-		bufs:alloc(pktsize - 4)
-		for i, buf in ipairs(bufs) do 			
-			local pkt = buf:getIP4Packet()
-                        pkt.ip4.src:set(baseIP + counter)
-                        for j = {{ payload_u32_offset }},{{ payload_u32_offset + 3 }},1 do
-                                pkt.payload.uint32[j] = te_counter
-                        end
-                        te_counter = incAndWrap(te_counter, table_entries)
-                        counter = incAndWrap(counter, flows)
-		end 
-		txQueue:send(bufs)
+{% if latency_digits %}
+{% if key_distribution == 'uniform' %}
+local ffi    = require "ffi"
+{% endif %}
+
+-- log-linear latency buckets in ns with DIGITS significant digits, as in HdrHistogram
+local DIGITS = {{ latency_digits }}
+local SUB_BITS = math.ceil(math.log(2 * 10 ^ DIGITS) / math.log(2))
+local SUB = 2 ^ SUB_BITS
+local HALF = SUB / 2
+-- latencies up to 2^40 ns
+local BUCKETS = SUB + (40 - SUB_BITS + 1) * HALF
+-- timestamped probes per second, 0 sends the next probe once the previous one returned
+local PROBE_RATE = {{ probe_rate }}
+-- seconds per interval snapshot
+local SNAPSHOT_INTERVAL = {{ latency_interval }}
+
+-- binary interval snapshots, little endian:
+--   file header   magic "LHD1", u32 significant digits, u32 number of buckets
+--   per interval  f64 start, f64 end (s since the first probe), u32 lost probes,
+--                 u32 number n of non-empty buckets, n times u32 bucket index and u32 count
+local SnapshotHeader = ffi.typeof("struct __attribute__((packed)) { double start; double stop; uint32_t lost; uint32_t buckets; }")
+
+local function bucketIndex(latency)
+	local value = math.max(0, math.floor(latency))
+	if value < SUB then
+		return value
+	end
+	local shift = math.floor(math.log(value) / math.log(2)) - SUB_BITS + 1
+	-- the logarithm may be off by one at powers of two
+	if math.floor(value / 2 ^ shift) >= SUB then
+		shift = shift + 1
+	elseif math.floor(value / 2 ^ shift) < HALF then
+		shift = shift - 1
+	end
+	return math.min(SUB + (shift - 1) * HALF + math.floor(value / 2 ^ shift) - HALF, BUCKETS - 1)
+end
+
+local function bucketValue(index)
+	-- middle of the bucket
+	if index < SUB then
+		return index
+	end
+	local shift = math.floor((index - SUB) / HALF) + 1
+	return ((index - SUB) % HALF + HALF) * 2 ^ shift + 2 ^ (shift - 1)
+end
+
+local function newRecorder()
+	return {counts = ffi.new("uint32_t[?]", BUCKETS), probes = 0, lost = 0, max = 0}
+end
+
+local function record(recorder, latency)
+	if not latency then
+		recorder.lost = recorder.lost + 1
+		return
+	end
+	local index = bucketIndex(latency)
+	recorder.counts[index] = recorder.counts[index] + 1
+	recorder.probes = recorder.probes + 1
+	recorder.max = math.max(recorder.max, latency)
+end
+
+local function percentile(recorder, p)
+	local threshold = math.max(1, math.ceil(recorder.probes * p / 100))
+	local seen = 0
+	for i = 0, BUCKETS - 1 do
+		seen = seen + recorder.counts[i]
+		if seen >= threshold then
+			return bucketValue(i)
+		end
 	end
+	return 0
+end
+
+local function summarize(out, name, recorder, start, stop)
+	out:write(string.format("%s,%.3f,%.3f,%d,%d,%.0f,%.0f,%.0f,%.0f\n", name, start, stop, recorder.probes, recorder.lost,
+		percentile(recorder, 50), percentile(recorder, 99), percentile(recorder, 99.9), recorder.max))
 end
 
-function timerSlave(txQueue, rxQueue, histfile)
+local function snapshot(out, recorder, start, stop)
+	local buckets = {}
+	for i = 0, BUCKETS - 1 do
+		if recorder.counts[i] > 0 then
+			table.insert(buckets, i)
+		end
+	end
+	local data = ffi.new("uint32_t[?]", 2 * #buckets + 1)
+	for n, i in ipairs(buckets) do
+		data[2 * n - 2] = i
+		data[2 * n - 1] = recorder.counts[i]
+	end
+	local header = SnapshotHeader(start, stop, recorder.lost, #buckets)
+	out:write(ffi.string(header, ffi.sizeof(header)), ffi.string(data, 8 * #buckets))
+end
+
+-- adds the interval to the whole measurement and starts the next interval
+local function merge(total, recorder)
+	for i = 0, BUCKETS - 1 do
+		total.counts[i] = total.counts[i] + recorder.counts[i]
+	end
+	total.probes = total.probes + recorder.probes
+	total.lost = total.lost + recorder.lost
+	total.max = math.max(total.max, recorder.max)
+	ffi.fill(recorder.counts, ffi.sizeof("uint32_t") * BUCKETS)
+	recorder.probes, recorder.lost, recorder.max = 0, 0, 0
+end
+
+-- the histogram file keeps the value,count rows of the flat histogram, one per non-empty bucket
+function timerSlave(txQueue, rxQueue, histfile, stopTime)
+	local timestamper = ts:newTimestamper(txQueue, rxQueue)
+	local tag = histfile:match("^histogram(.*)%.csv$") or ""
+	local total = newRecorder()
+	local interval = newRecorder()
+	local snapshots = io.open("latency-intervals" .. tag .. ".bin", "wb")
+	snapshots:write("LHD1", ffi.string(ffi.new("uint32_t[2]", {DIGITS, BUCKETS}), 8))
+	local summary = io.open("latency-summary" .. tag .. ".csv", "w")
+	summary:write("interval,start,end,probes,lost,p50,p99,p99.9,max\n")
+	if not stopTime then
+		mg.sleepMillis(1000) -- ensure that the load task is running
+	end
+	local start = mg.getTime()
+	local intervalStart = start
+	local number = 1
+	local nextProbe = start
+	while mg.running() and (not stopTime or mg.getTime() < stopTime) do
+		if PROBE_RATE > 0 then
+			-- probes start at fixed deadlines, the round trip is part of the period
+			local wait = nextProbe - mg.getTime()
+			if wait > 0 then
+				mg.sleepMicros(math.floor(wait * 1000000))
+			end
+			-- deadlines missed during a long round trip are skipped, not caught up
+			nextProbe = math.max(nextProbe + 1 / PROBE_RATE, mg.getTime())
+		end
+		record(interval, timestamper:measureLatency(function(buf) buf:getEthernetPacket().eth.dst:setString(ETH_DST) end))
+		local now = mg.getTime()
+		if now - intervalStart >= SNAPSHOT_INTERVAL then
+			snapshot(snapshots, interval, intervalStart - start, now - start)
+			summarize(summary, number, interval, intervalStart - start, now - start)
+			merge(total, interval)
+			intervalStart = now
+			number = number + 1
+		end
+	end
+	local now = mg.getTime()
+	if interval.probes + interval.lost > 0 then
+		snapshot(snapshots, interval, intervalStart - start, now - start)
+		summarize(summary, number, interval, intervalStart - start, now - start)
+		merge(total, interval)
+	end
+	summarize(summary, "total", total, 0, now - start)
+	snapshots:close()
+	summary:close()
+
+	local out = io.open(histfile, "w")
+	for i = 0, BUCKETS - 1 do
+		if total.counts[i] > 0 then
+			out:write(string.format("%.0f,%d\n", bucketValue(i), total.counts[i]))
+		end
+	end
+	out:close()
+	print(string.format("Latency p50 %.0f ns, p99 %.0f ns, p99.9 %.0f ns, max %.0f ns, %d probes, %d lost",
+		percentile(total, 50), percentile(total, 99), percentile(total, 99.9), total.max, total.probes, total.lost))
+end
+{% else %}
+function timerSlave(txQueue, rxQueue, histfile, stopTime)
 	local timestamper = ts:newTimestamper(txQueue, rxQueue)
 	local hist = hist:new()
-	mg.sleepMillis(1000) -- ensure that the load task is running
-	while mg.running() do
+	if not stopTime then
+		mg.sleepMillis(1000) -- ensure that the load task is running
+	end
+	while mg.running() and (not stopTime or mg.getTime() < stopTime) do
 		hist:update(timestamper:measureLatency(function(buf) buf:getEthernetPacket().eth.dst:setString(ETH_DST) end))
 	end
 	hist:print()
 	hist:save(histfile)
 end
+{% endif %}
 
-function txrxCounterSlave(txDev, rxDev)
+function txrxCounterSlave(txDevs, rxDev, tag, stopTime)
         print("Started TX/RX counter")
+        tag = tag or ""
 
-        local txCtr = stats:newDevTxCounter(txDev, "csv", "throughput-tx.csv")
-        local rxCtr = stats:newDevRxCounter(rxDev, "csv", "throughput-rx.csv")
+        -- the first tx device keeps the file name of a single port
+        local txCtrs = {}
+        for i, txDev in ipairs(txDevs) do
+                local suffix = i == 1 and "" or "-port" .. txDev.id
+                table.insert(txCtrs, stats:newDevTxCounter(txDev, "csv", "throughput-tx" .. tag .. suffix .. ".csv"))
+        end
+        local rxCtr = stats:newDevRxCounter(rxDev, "csv", "throughput-rx" .. tag .. ".csv")
 
-        while mg.running() do
-                txCtr:update()
+        while mg.running() and (not stopTime or mg.getTime() < stopTime) do
+                for _, txCtr in ipairs(txCtrs) do
+                        txCtr:update()
+                end
                 rxCtr:update()
         end
 
-        txCtr:finalize()
+        for _, txCtr in ipairs(txCtrs) do
+                txCtr:finalize()
+        end
         rxCtr:finalize()
 end
@@ -19,23 +19,57 @@ local function getRstFile(...)
 	return nil, nil
 end
 
+{% include 'moongen/lua/shared/load.lua' %}
+
 function configure(parser)
 	parser:description("Generates bidirectional CBR traffic with hardware rate control and measure latencies.")
-	parser:argument("dev1", "Device to transmit/receive from."):convert(tonumber)
+	parser:argument("dev1", "Devices to transmit from, comma-separated.")
 	parser:argument("dev2", "Device to transmit/receive from."):convert(tonumber)
-	parser:option("-r --rate", "Transmit rate in Mbit/s."):default(10000):convert(tonumber)
+	parser:option("-r --rate", "Transmit rate in Mbit/s."):default({{ max_rate }}):convert(tonumber)
 	parser:option("-p --pktrate", "Transmit rate in pps."):default(0):convert(tonumber)
 	parser:option("-s --pktsize", "Packetsize in bytes (incl. crc)."):default(64):convert(tonumber)
 	parser:option("-f --file", "Filename of the latency histogram."):default("histogram.csv")
 	parser:option("-f --flows", "Number of different IPs to use (multi core testing)."):default(100):convert(tonumber)
 	parser:option("-t --table-entries", "Number of different table entries."):default(4):convert(tonumber)
+	parser:option("--pktsizes", "Comma-separated packet sizes to step through in one process."):default("")
+	parser:option("--duration", "Measurement time per step in seconds."):default(10):convert(tonumber)
+	parser:option("--settle", "Time before the measurement of each step in seconds."):default(2):convert(tonumber)
+end
+
+-- one step per packet size, counters are written to CSVs tagged with the size
+local function sweep(txDevs, txQueues, dev2, args)
+	local rate = args.rate / #txQueues
+	for _, queue in ipairs(txQueues) do
+		queue:setRate(rate)
+	end
+	for size in string.gmatch(args.pktsizes, "[^,]+") do
+		local pktsize = math.max(tonumber(size), 64)
+		local stopTime = mg.getTime() + args.settle + args.duration
+		local tasks = {}
+		for _, queue in ipairs(txQueues) do
+			table.insert(tasks, mg.startTask("loadSlave", queue, pktsize, args.flows, args.table_entries, stopTime))
+		end
+		mg.sleepMillis(math.floor(args.settle * 1000))
+		table.insert(tasks, mg.startTask("txrxCounterSlave", txDevs, dev2, "-" .. size, stopTime))
+		for _, task in ipairs(tasks) do
+			task:wait()
+		end
+		if not mg.running() then
+			break
+		end
+	end
 end
 
 function master(args)
-	local dev1 = device.config({port = args.dev1, txQueues = 4})
+	local txDevs, txQueues = configureTx(args.dev1)
 	local dev2 = device.config({port = args.dev2, rxQueues = 1})
 	device.waitForLinks()
 
+	if args.pktsizes ~= "" then
+		sweep(txDevs, txQueues, dev2, args)
+		return
+	end
+
 	pktsize = args.pktsize
 	if args.pktsize < 64 then
 		pktsize = 64
@@ -45,60 +79,40 @@ function master(args)
 	if args.pktrate > 0 then
 		rate = (args.pktrate * (pktsize) * 8) / 1000000
 	end
-	rate = rate / 4
-	dev1:getTxQueue(0):setRate(rate)
-	dev1:getTxQueue(1):setRate(rate)
-	dev1:getTxQueue(2):setRate(rate)
-	dev1:getTxQueue(3):setRate(rate)
-
-	mg.startTask("txrxCounterSlave", dev1, dev2)
+	rate = rate / #txQueues
+	for _, queue in ipairs(txQueues) do
+		queue:setRate(rate)
+	end
 
-	mg.startTask("loadSlave", dev1:getTxQueue(0), pktsize, args.flows, args.table_entries)
-	mg.startTask("loadSlave", dev1:getTxQueue(1), pktsize, args.flows, args.table_entries)
-	mg.startTask("loadSlave", dev1:getTxQueue(2), pktsize, args.flows, args.table_entries)
-	mg.startTask("loadSlave", dev1:getTxQueue(3), pktsize, args.flows, args.table_entries)
-	mg.waitForTasks()
-end
+	mg.startTask("txrxCounterSlave", txDevs, dev2)
 
-function loadSlave(txQueue, pktsize, flows, table_entries)
-	local baseIP = parseIPAddress("10.0.0.1")
-	local mem = memory.createMemPool(function(buf)
-		buf:getIP4Packet():fill{ 
-			ethSrc = queue,
-			ethDst = "12:34:56:78:9a:bc",
-			pktLength = pktsize
-		}
-	end)
-	local bufs = mem:bufArray()
-	local counter = 0
-	local te_counter = 0
-	while mg.running() do
-		bufs:alloc(pktsize - 4)
-		for i, buf in ipairs(bufs) do 			
-			local pkt = buf:getIP4Packet()
-                        pkt.ip4.src:set(baseIP + counter)
-                        for j = {{ payload_u32_offset }},{{ payload_u32_offset + 3 }},1 do
-                                pkt.payload.uint32[j] = te_counter
-                                --pkt.payload.uint32[j] = te_counter  + 0xFF -- for lpm tests
-                        end
-                        te_counter = incAndWrap(te_counter, table_entries)
-                        counter = incAndWrap(counter, flows)
-		end 
-		txQueue:send(bufs)
+	for _, queue in ipairs(txQueues) do
+		mg.startTask("loadSlave", queue, pktsize, args.flows, args.table_entries)
 	end
+	mg.waitForTasks()
 end
 
-function txrxCounterSlave(txDev, rxDev)
+function txrxCounterSlave(txDevs, rxDev, tag, stopTime)
         print("Started TX/RX counter")
+        tag = tag or ""
 
-        local txCtr = stats:newDevTxCounter(txDev, "csv", "throughput-tx.csv")
-        local rxCtr = stats:newDevRxCounter(rxDev, "csv", "throughput-rx.csv")
+        -- the first tx device keeps the file name of a single port
+        local txCtrs = {}
+        for i, txDev in ipairs(txDevs) do
+                local suffix = i == 1 and "" or "-port" .. txDev.id
+                table.insert(txCtrs, stats:newDevTxCounter(txDev, "csv", "throughput-tx" .. tag .. suffix .. ".csv"))
+        end
+        local rxCtr = stats:newDevRxCounter(rxDev, "csv", "throughput-rx" .. tag .. ".csv")
 
-        while mg.running() do
-                txCtr:update()
+        while mg.running() and (not stopTime or mg.getTime() < stopTime) do
+                for _, txCtr in ipairs(txCtrs) do
+                        txCtr:update()
+                end
                 rxCtr:update()
         end
 
-        txCtr:finalize()
+        for _, txCtr in ipairs(txCtrs) do
+                txCtr:finalize()
+        end
         rxCtr:finalize()
 end
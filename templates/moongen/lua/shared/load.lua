@@ -0,0 +1,205 @@
+-- load queues and the loadSlave task, included by max-load.lua, latency.lua and zero-loss.lua
+{% if key_distribution != 'uniform' %}
+local ffi    = require "ffi"
+
+-- table entries drawn once per queue from the {{ key_distribution }} distribution, packets cycle through them
+local KEY_SAMPLES = 4194304
+{% if key_distribution == 'zipf' %}
+local ZIPF_S = {{ zipf_s }}
+{% else %}
+local HOT_FRACTION = {{ hot_fraction }}
+local HOT_SHARE = {{ hot_share }}
+{% endif %}
+
+local function keySequence(table_entries, seed)
+	math.randomseed(seed)
+	local keys = ffi.new("uint32_t[?]", KEY_SAMPLES)
+{% if key_distribution == 'zipf' %}
+	-- inverse of the bounded power law approximating zipf, ranks 1 to table_entries
+	local n = table_entries + 1
+	for i = 0, KEY_SAMPLES - 1 do
+		local rank
+		if ZIPF_S == 1 then
+			rank = n ^ math.random()
+		else
+			rank = ((n ^ (1 - ZIPF_S) - 1) * math.random() + 1) ^ (1 / (1 - ZIPF_S))
+		end
+		keys[i] = math.min(math.floor(rank), table_entries) - 1
+	end
+{% else %}
+	local hot = math.max(1, math.floor(table_entries * HOT_FRACTION))
+	for i = 0, KEY_SAMPLES - 1 do
+		if hot >= table_entries or math.random() < HOT_SHARE then
+			keys[i] = math.random(0, hot - 1)
+		else
+			keys[i] = math.random(hot, table_entries - 1)
+		end
+	end
+{% endif %}
+	return keys
+end
+
+{% endif %}
+{% if imix %}
+-- simple IMIX, 7:4:1 packets of 64, 576 and 1500 bytes (incl. crc)
+local IMIX = {64, 576, 64, 64, 576, 64, 1500, 64, 576, 64, 64, 576}
+local IMIX_LENGTH = 12
+
+{% endif %}
+{% if paced %}
+-- bytes per second of a tx link, delays between packets are given in byte times
+local LINK_BYTES = {{ link_speed }} * 10^9 / 8
+{% if pattern == 'burst' %}
+-- packets sent back to back before the gap of the whole burst
+local BURST_SIZE = {{ burst_size }}
+{% else %}
+
+local function poissonDelay(mean)
+	return math.floor(-math.log(1 - math.random()) * mean + 0.5)
+end
+{% endif %}
+
+{% endif %}
+-- load queues per tx device, each served by a task on its own core
+{% if paced %}
+-- paced patterns send from a single queue per device, the delays of queues
+-- sharing a link would interleave and each queue get only part of the link
+local TX_QUEUES = 1
+{% else %}
+local TX_QUEUES = {{ tx_queues }}
+{% endif %}
+
+-- tx devices of a comma-separated list of ports and all their load queues
+local function configureTx(ports, extraQueues)
+	local devs = {}
+	local queues = {}
+	for port in string.gmatch(ports, "[^,]+") do
+		local dev = device.config({port = tonumber(port), txQueues = TX_QUEUES + (extraQueues or 0)})
+		table.insert(devs, dev)
+		for i = 0, TX_QUEUES - 1 do
+			table.insert(queues, dev:getTxQueue(i))
+		end
+	end
+	return devs, queues
+end
+
+{% if packet_ring %}
+-- largest ring of precomputed packets per queue, longer periods of flows and
+-- table entries are written per packet as without the ring
+local RING_MAX = 32767
+
+local function gcd(a, b)
+	while b ~= 0 do
+		a, b = b, a % b
+	end
+	return a
+end
+
+-- the ring is allocated once and resent in its order, each send takes a reference
+-- on every buffer so the driver never returns them to the pool, whose per-core
+-- cache hands out recently freed buffers first and would break the round-robin
+local function sendRing(txQueue, pktsize, flows, table_entries, stopTime, baseIP, period)
+	-- whole periods, at least the default pool size
+	local ring = period * math.ceil(2047 / period)
+	local mem = memory.createMemPool({n = ring, func = function(buf)
+		buf:getIP4Packet():fill{
+			ethSrc = queue,
+			ethDst = "12:34:56:78:9a:bc",
+			pktLength = pktsize
+		}
+	end})
+	local bufs = mem:bufArray(ring)
+	bufs:alloc(pktsize - 4)
+	for i, buf in ipairs(bufs) do
+		local pkt = buf:getIP4Packet()
+		pkt.ip4.src:set(baseIP + (i - 1) % flows)
+		for j = {{ payload_u32_offset }},{{ payload_u32_offset + 3 }},1 do
+			pkt.payload.uint32[j] = (i - 1) % table_entries
+		end
+	end
+	while mg.running() and (not stopTime or mg.getTime() < stopTime) do
+		for _, buf in ipairs(bufs) do
+			buf.refcnt = buf.refcnt + 1
+		end
+		txQueue:send(bufs)
+	end
+end
+
+{% endif %}
+function loadSlave(txQueue, pktsize, flows, table_entries, stopTime, queueRate)
+	local baseIP = parseIPAddress("10.0.0.1")
+{% if packet_ring %}
+	-- one period of the round-robin flows and table entries
+	local period = flows / gcd(flows, table_entries) * table_entries
+	if period <= RING_MAX then
+		sendRing(txQueue, pktsize, flows, table_entries, stopTime, baseIP, period)
+		return
+	end
+	print(string.format("Period of %d packets exceeds the ring of %d, writing every packet", period, RING_MAX))
+{% endif %}
+	local mem = memory.createMemPool(function(buf)
+		buf:getIP4Packet():fill{
+			ethSrc = queue,
+			ethDst = "12:34:56:78:9a:bc",
+			pktLength = pktsize
+		}
+	end)
+	local bufs = mem:bufArray()
+	local counter = 0
+	local te_counter = 0
+{% if key_distribution != 'uniform' %}
+	local keys = keySequence(table_entries, txQueue.id * 64 + txQueue.qid + 1)
+	local key_counter = 0
+{% endif %}
+{% if imix %}
+	local imix_counter = 0
+{% endif %}
+{% if paced and pattern == 'burst' %}
+	local burst_counter = 0
+	local burst_bytes = 0
+{% endif %}
+	while mg.running() and (not stopTime or mg.getTime() < stopTime) do
+		bufs:alloc(pktsize - 4)
+		for i, buf in ipairs(bufs) do
+			local pkt = buf:getIP4Packet()
+                        pkt.ip4.src:set(baseIP + counter)
+                        for j = {{ payload_u32_offset }},{{ payload_u32_offset + 3 }},1 do
+{% if key_distribution != 'uniform' %}
+                                pkt.payload.uint32[j] = keys[key_counter]
+{% else %}
+                                pkt.payload.uint32[j] = te_counter
+{% endif %}
+                                --pkt.payload.uint32[j] = te_counter  + 0xFF -- for lpm tests
+                        end
+{% if key_distribution != 'uniform' %}
+                        key_counter = incAndWrap(key_counter, KEY_SAMPLES)
+{% else %}
+                        te_counter = incAndWrap(te_counter, table_entries)
+{% endif %}
+                        counter = incAndWrap(counter, flows)
+{% if imix %}
+                        local size = IMIX[imix_counter + 1]
+                        imix_counter = incAndWrap(imix_counter, IMIX_LENGTH)
+                        buf:setSize(size - 4)
+                        pkt.ip4:setLength(size - 18)
+{% endif %}
+{% if paced and pattern == 'poisson' %}
+                        buf:setDelay(poissonDelay(math.max(0, LINK_BYTES / queueRate - {% if imix %}size{% else %}pktsize{% endif %} - 24)))
+{% elif paced and pattern == 'burst' %}
+                        burst_bytes = burst_bytes + {% if imix %}size{% else %}pktsize{% endif %} + 24
+                        burst_counter = incAndWrap(burst_counter, BURST_SIZE)
+                        if burst_counter == 0 then
+                                buf:setDelay(math.floor(math.max(0, BURST_SIZE * LINK_BYTES / queueRate - burst_bytes)))
+                                burst_bytes = 0
+                        else
+                                buf:setDelay(0)
+                        end
+{% endif %}
+		end
+{% if paced %}
+		txQueue:sendWithDelay(bufs)
+{% else %}
+		txQueue:send(bufs)
+{% endif %}
+	end
+end
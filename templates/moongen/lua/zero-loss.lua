@@ -0,0 +1,102 @@
+local mg     = require "moongen"
+local memory = require "memory"
+local device = require "device"
+local log    = require "log"
+
+{% include 'moongen/lua/shared/load.lua' %}
+
+local function txPackets(devs)
+	local packets = 0
+	for _, dev in ipairs(devs) do
+		packets = packets + dev:getTxStats()
+	end
+	return packets
+end
+
+function configure(parser)
+	parser:description("Searches the highest rate at which the loss of the DuT stays below a threshold (RFC 2544 throughput).")
+	parser:argument("dev1", "Devices to transmit from, comma-separated.")
+	parser:argument("dev2", "Device to receive from."):convert(tonumber)
+	parser:option("-r --rate", "Upper bound of the search in Mbit/s."):default({{ max_rate }}):convert(tonumber)
+	parser:option("-p --pktrate", "Upper bound of the search in pps, overrides --rate."):default(0):convert(tonumber)
+	parser:option("-s --pktsize", "Packetsize in bytes (incl. crc)."):default(64):convert(tonumber)
+	parser:option("-f --flows", "Number of different IPs to use (multi core testing)."):default(100):convert(tonumber)
+	parser:option("-t --table-entries", "Number of different table entries."):default(4):convert(tonumber)
+	parser:option("-l --loss", "Highest accepted loss ratio."):default(0.001):convert(tonumber)
+	parser:option("-d --trial", "Duration of a trial in seconds."):default(5):convert(tonumber)
+	parser:option("-e --precision", "Stop once the search interval is below this fraction of its upper bound."):default(0.01):convert(tonumber)
+	parser:option("-m --max-trials", "Maximum number of trials."):default(12):convert(tonumber)
+	parser:option("-o --output", "CSV file of all trials."):default("zero-loss.csv")
+	parser:option("-R --result", "File with the highest loss-free rate in pps."):default("zero-loss-rate.txt")
+end
+
+function master(args)
+	local txDevs, queues = configureTx(args.dev1)
+	local dev2 = device.config({port = args.dev2, rxQueues = 1})
+	device.waitForLinks()
+
+	pktsize = args.pktsize
+	if args.pktsize < 64 then
+		pktsize = 64
+	end
+
+	local function setRate(pps)
+		local rate = (pps * (pktsize) * 8) / 1000000 / #queues
+		for _, queue in ipairs(queues) do
+			queue:setRate(rate)
+		end
+	end
+
+	local maxRate = (args.rate * 1000000) / ((pktsize) * 8)
+	if args.pktrate > 0 then
+		maxRate = args.pktrate
+	end
+	setRate(maxRate)
+	for _, queue in ipairs(queues) do
+		mg.startTask("loadSlave", queue, pktsize, args.flows, args.table_entries)
+	end
+
+	-- binary search, starting at the upper bound
+	local out = io.open(args.output, "w")
+	out:write("trial,rate,tx,rx,loss\n")
+	local low, high, rate = 0, maxRate, maxRate
+	for trial = 1, args.max_trials do
+		if not mg.running() then
+			break
+		end
+		setRate(rate)
+		-- let queues of the previous rate drain
+		mg.sleepMillis(1000)
+		local tx0 = txPackets(txDevs)
+		local rx0 = dev2:getRxStats()
+		mg.sleepMillis(args.trial * 1000)
+		local tx = txPackets(txDevs) - tx0
+		local rx = dev2:getRxStats() - rx0
+		local loss = 1
+		if tx > 0 then
+			loss = math.max(0, (tx - rx) / tx)
+		end
+		out:write(string.format("%d,%.0f,%d,%d,%.6f\n", trial, rate, tx, rx, loss))
+		log:info("Trial %d at %.0f pps: loss %.6f", trial, rate, loss)
+
+		-- the result is the highest offered rate that passed, rx stays in the csv
+		if loss <= args.loss then
+			low = rate
+		else
+			high = rate
+		end
+		if (high - low) <= args.precision * high then
+			break
+		end
+		rate = (low + high) / 2
+	end
+	out:close()
+
+	local result = io.open(args.result, "w")
+	result:write(string.format("%.0f\n", low))
+	result:close()
+	log:info("Highest loss-free rate: %.0f pps", low)
+
+	mg.stop()
+	mg.waitForTasks()
+end
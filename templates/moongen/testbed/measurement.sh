@@ -8,16 +8,26 @@
 
 set -x
 
-DURATION_STARTUP=5
+FORWARDING_TIMEOUT=30
 DURATION_MAX_LOAD=$(pos_get_variable duration/max_load --from-global)
 DURATION_LATENCY=$(pos_get_variable duration/latency --from-global)
 REPEAT_MAX_LOAD=$(pos_get_variable --from-global repeat_max_load)
+REPEAT_MIN_LOAD=$(pos_get_variable --from-global repeat_min_load)
+TARGET_CI=$(pos_get_variable --from-global target_ci)
 
-{% if scale_packet_size %}
+{% if sweep_packet_size %}
+PACKET_SIZES=$(pos_get_variable sweep/packet_sizes --from-global)
+{% elif scale_packet_size %}
 PACKET_SIZE=$(pos_get_variable packet_size --from-loop)
 {% else %}
 PACKET_SIZE=$(pos_get_variable packet_size)
 {% endif %}
+{% if sweep %}
+# packet sizes and latency rates are stepped through in one MoonGen process
+SWEEP_SETTLE=$(pos_get_variable sweep/settle --from-global)
+PACKET_SIZES=${PACKET_SIZES:-${PACKET_SIZE}}
+SWEEP_STEPS=$(echo ${PACKET_SIZES} | wc -w)
+{% endif %}
 
 {% if measure_latency %}
 {% if scale_load %}
@@ -36,32 +46,188 @@ TABLE_ENTRIES=$(pos_get_variable table_entries --from-loop)
 RX_PORT=$(pos_get_variable port/rx)
 TX_PORT=$(pos_get_variable port/tx)
 
+# wait_forwarding TIMEOUT [FILE], forwarding is verified once packets came back from the dut
+wait_forwarding() {
+	local start=${SECONDS}
+	local file=${2:-throughput-rx.csv}
+	while (( SECONDS - start <= $1 )); do
+		if [[ -f ${file} ]] && awk -F, 'NR == 1 { for (i = 1; i <= NF; i++) if ($i == "TotalPackets") col = i } NR > 1 && col && $col > 0 { found = 1 } END { exit !found }' ${file}; then
+			echo "forwarding verified after $(( SECONDS - start )) s"
+			return 0
+		fi
+		sleep 0.2
+	done
+	echo "forwarding not verified after $1 s"
+	return 1
+}
+
 
 # start max load test
 for (( REPETITION=1; REPETITION<=$REPEAT_MAX_LOAD; REPETITION++ ))
 do
 	# wait for dut to start up
 	pos_sync --loop --tag dut_startup_${REPETITION}_completed
+	# no load without a started dut, the repetition is marked failed in its startup.csv
+	if [[ $(pos_get_variable --from-global dut_startup) != ok ]]; then
+		echo "dut did not start up, skipping repetition ${REPETITION}"
+		pos_sync --loop --tag max_load_measurement_${REPETITION}_started
+		pos_set_variable --as-global max_load_stop 0
+		pos_sync --loop --tag max_load_measurement_${REPETITION}_finished
+		continue
+	fi
 
+{% if sweep %}
+	rm -f throughput-rx-*.csv throughput-tx-*.csv
+	pos_run lg_max_load_${REPETITION} --loop -- /root/moongen/build/MoonGen /root/max-load.lua ${TX_PORT} ${RX_PORT} {% if scale_table_entries %}-t ${TABLE_ENTRIES}{% endif %} --pktsizes ${PACKET_SIZES// /,} --duration ${DURATION_MAX_LOAD} --settle ${SWEEP_SETTLE}
+	# the first step measures after its settle interval
+	wait_forwarding $(( FORWARDING_TIMEOUT + SWEEP_SETTLE )) throughput-rx-${PACKET_SIZES%% *}.csv
+	pos_sync --loop --tag max_load_measurement_${REPETITION}_started
+	sleep $(( SWEEP_STEPS * (DURATION_MAX_LOAD + SWEEP_SETTLE) - SWEEP_SETTLE ))
+	pos_kill lg_max_load_${REPETITION} --loop
+	for SIZE in ${PACKET_SIZES}; do
+		mv throughput-rx-${SIZE}.csv throughput-max-rx-${SIZE}.csv_${REPETITION}
+		mv throughput-tx-${SIZE}.csv throughput-max-tx-${SIZE}.csv_${REPETITION}
+	done
+{% else %}
+	rm -f throughput-rx.csv throughput-tx.csv
 	pos_run lg_max_load_${REPETITION} --loop -- /root/moongen/build/MoonGen /root/max-load.lua ${TX_PORT} ${RX_PORT} {% if scale_table_entries %}-t ${TABLE_ENTRIES}{% endif %} --pktsize ${PACKET_SIZE}
-	sleep ${DURATION_STARTUP}
+	wait_forwarding ${FORWARDING_TIMEOUT}
 	pos_sync --loop --tag max_load_measurement_${REPETITION}_started
 	sleep ${DURATION_MAX_LOAD}
 	pos_kill lg_max_load_${REPETITION} --loop
+	mv throughput-rx.csv throughput-max-rx.csv_${REPETITION}
+	mv throughput-tx.csv throughput-max-tx.csv_${REPETITION}
+{% endif %}
+
+	# stop early once the repetitions agree, the dut reads the decision after the sync
+	STOP=0
+	if [[ $REPETITION -ge $REPEAT_MIN_LOAD && $REPETITION -lt $REPEAT_MAX_LOAD ]]; then
+{% if sweep %}
+		# only once every packet size converged
+		STOP=1
+		for SIZE in ${PACKET_SIZES}; do
+			if [[ $(python3 get_max_rate.py --tag -${SIZE} --converged ${TARGET_CI} --output max_rate-${SIZE}.json) != 1 ]]; then
+				STOP=0
+			fi
+		done
+{% else %}
+		STOP=$(python3 get_max_rate.py --converged ${TARGET_CI} --output max_rate.json)
+{% endif %}
+	fi
+	pos_set_variable --as-global max_load_stop ${STOP}
 
 	# notify end
 	pos_sync --loop --tag max_load_measurement_${REPETITION}_finished
 
 	# upload data
-	mv throughput-rx.csv throughput-max-rx.csv_${REPETITION}
-	mv throughput-tx.csv throughput-max-tx.csv_${REPETITION}
+{% if sweep %}
+	for SIZE in ${PACKET_SIZES}; do
+		pos_upload --loop throughput-max-rx-${SIZE}.csv_${REPETITION}
+		pos_upload --loop throughput-max-tx-${SIZE}.csv_${REPETITION}
+	done
+{% else %}
 	pos_upload --loop throughput-max-rx.csv_${REPETITION}
 	pos_upload --loop throughput-max-tx.csv_${REPETITION}
+{% endif %}
+	if [[ $STOP == 1 ]]; then
+		echo "max load converged after ${REPETITION} repetitions"
+		break
+	fi
 done
 
+{% if measure_latency or measure_zero_loss %}
+# determine the steady-state max rate, robust against single peaks
+{% if sweep %}
+declare -A MAX_RATES
+for SIZE in ${PACKET_SIZES}; do
+	MAX_RATES[${SIZE}]=$(python3 get_max_rate.py --tag -${SIZE} --statistic median --output max_rate-${SIZE}.json)
+	pos_upload --loop max_rate-${SIZE}.json
+done
+{% else %}
+MAX_RATE=$(python3 get_max_rate.py --statistic median --output max_rate.json)
+pos_upload --loop max_rate.json
+{% endif %}
+{% endif %}
+
+{% if measure_zero_loss %}
+# highest rate with a loss below the threshold, searched up to the max load
+{% if sweep %}
+for PACKET_SIZE in ${PACKET_SIZES}; do
+MAX_RATE=${MAX_RATES[${PACKET_SIZE}]}
+{% endif %}
+LOSS_THRESHOLD=$(pos_get_variable zero_loss/loss --from-global)
+ZERO_LOSS_TRIAL=$(pos_get_variable zero_loss/trial --from-global)
+ZERO_LOSS_PRECISION=$(pos_get_variable zero_loss/precision --from-global)
+ZERO_LOSS_TRIALS=$(pos_get_variable zero_loss/max_trials --from-global)
+UPPER_RATE=$(python3 multiply_floats.py 1.05 ${MAX_RATE})
+rm -f zero-loss.csv zero-loss-rate.txt
+pos_run lg_zero_loss{% if sweep %}_${PACKET_SIZE}{% endif %} --loop -- /root/moongen/build/MoonGen /root/zero-loss.lua ${TX_PORT} ${RX_PORT} -p ${UPPER_RATE} -l ${LOSS_THRESHOLD} -d ${ZERO_LOSS_TRIAL} -e ${ZERO_LOSS_PRECISION} -m ${ZERO_LOSS_TRIALS} {% if scale_table_entries %}-t ${TABLE_ENTRIES}{% endif %} --pktsize ${PACKET_SIZE}
+# the search ends by itself, one second per trial to settle
+ZERO_LOSS_TIMEOUT=$(( ZERO_LOSS_TRIALS * (ZERO_LOSS_TRIAL + 1) + FORWARDING_TIMEOUT ))
+for (( i = 0; i < ZERO_LOSS_TIMEOUT; i++ )); do
+	if [[ -s zero-loss-rate.txt ]]; then
+		break
+	fi
+	sleep 1
+done
+pos_kill lg_zero_loss{% if sweep %}_${PACKET_SIZE}{% endif %} --loop
+{% if sweep %}
+pos_upload --loop zero-loss.csv --outfile zero-loss-${PACKET_SIZE}.csv
+pos_upload --loop zero-loss-rate.txt --outfile zero-loss-rate-${PACKET_SIZE}.txt
+{% else %}
+pos_upload --loop zero-loss.csv
+pos_upload --loop zero-loss-rate.txt
+{% endif %}
 {% if measure_latency %}
-# determine max rate
-MAX_RATE=$(python3 get_max_rate.py)
+# the latency loads are relative to the verified loss-free offered rate
+if [[ -s zero-loss-rate.txt && $(cat zero-loss-rate.txt) != "0" ]]; then
+	MAX_RATE=$(cat zero-loss-rate.txt)
+fi
+{% endif %}
+{% if sweep %}
+MAX_RATES[${PACKET_SIZE}]=${MAX_RATE}
+done
+{% endif %}
+{% endif %}
+
+{% if measure_latency and sweep %}
+# one step per packet size and latency rate, SIZE:PPS:TAG
+STEPS=()
+for SIZE in ${PACKET_SIZES}; do
+{% if scale_load %}
+	STEPS+=("${SIZE}:$(python3 multiply_floats.py ${LATENCY_RATE} ${MAX_RATES[${SIZE}]}):${SIZE}-rate")
+{% else %}
+	for multiplier in ${LATENCY_RATES}; do
+		STEPS+=("${SIZE}:$(python3 multiply_floats.py ${multiplier} ${MAX_RATES[${SIZE}]}):${SIZE}-${multiplier}")
+	done
+{% endif %}
+done
+echo "latency steps are ${STEPS[*]}"
+
+rm -f throughput-rx-*.csv throughput-tx-*.csv histogram-*.csv latency-intervals-*.bin latency-summary-*.csv
+pos_run lg_latency --loop -- /root/moongen/build/MoonGen /root/latency.lua ${TX_PORT} ${RX_PORT} {% if scale_table_entries %}-t ${TABLE_ENTRIES}{% endif %} --steps $(IFS=,; echo "${STEPS[*]}") --duration ${DURATION_LATENCY} --settle ${SWEEP_SETTLE}
+wait_forwarding $(( FORWARDING_TIMEOUT + SWEEP_SETTLE )) throughput-rx-${STEPS[0]##*:}.csv
+sleep $(( $(echo ${STEPS[*]} | wc -w) * (DURATION_LATENCY + SWEEP_SETTLE) - SWEEP_SETTLE ))
+# the histogram of the last step is written once its measurement ended
+for (( i = 0; i < FORWARDING_TIMEOUT; i++ )); do
+	if [[ -s histogram-${STEPS[-1]##*:}.csv ]]; then
+		break
+	fi
+	sleep 1
+done
+pos_kill lg_latency --loop
+# upload data
+for STEP in "${STEPS[@]}"; do
+	TAG=${STEP##*:}
+	pos_upload --loop throughput-rx-${TAG}.csv --outfile throughput-${TAG}-rx.csv
+	pos_upload --loop throughput-tx-${TAG}.csv --outfile throughput-${TAG}-tx.csv
+	pos_upload --loop histogram-${TAG}.csv
+{% if latency_recorder %}
+	pos_upload --loop latency-intervals-${TAG}.bin
+	pos_upload --loop latency-summary-${TAG}.csv
+{% endif %}
+done
+{% elif measure_latency %}
 
 {% if scale_load %}
        LG_NAME="lg_rate"
@@ -75,14 +241,19 @@ do
 {% endif %}
        echo "rate is ${RATE}"
 
+       rm -f throughput-rx.csv throughput-tx.csv
        pos_run ${LG_NAME} --loop -- /root/moongen/build/MoonGen /root/latency.lua ${TX_PORT} ${RX_PORT} -p ${RATE} {% if scale_table_entries %}-t ${TABLE_ENTRIES}{% endif %} --pktsize ${PACKET_SIZE}
-       sleep ${DURATION_STARTUP}
+       wait_forwarding ${FORWARDING_TIMEOUT}
        sleep ${DURATION_LATENCY}
        pos_kill ${LG_NAME} --loop
        # upload data
        pos_upload --loop throughput-rx.csv --outfile throughput-${multiplier}-rx.csv
        pos_upload --loop throughput-tx.csv --outfile throughput-${multiplier}-tx.csv
        pos_upload --loop histogram.csv --outfile histogram-${multiplier}.csv
+{% if latency_recorder %}
+       pos_upload --loop latency-intervals.bin --outfile latency-intervals-${multiplier}.bin
+       pos_upload --loop latency-summary.csv --outfile latency-summary-${multiplier}.csv
+{% endif %}
 {% if not scale_load %}
 done
 {% endif %}
@@ -1,19 +1,120 @@
 #! /usr/bin/python3
 
+import os
 import csv
+import json
+import argparse
+import statistics
 
 repetitions = {{ repetitions }}
 
-rates = []
-for rep in range(1, repetitions + 1):
-    with open('throughput-max-rx.csv_{}'.format(str(rep)), 'r') as fh:
-        reader = csv.DictReader(fh, delimiter=',')
-        max_row = next(reader)
-        compare = 'PacketRate'
-        for row in reader:
-            if row[compare] > max_row[compare]:
-                max_row = row
-        # print(','.join(list(max_row.values())[3:6]))
-        max_rate = float(max_row[compare]) * 1000000
-        rates.append(max_rate)
-print(max(rates))
+
+def argument_parser():
+    parser = argparse.ArgumentParser('Steady-state packet rate of the max load repetitions')
+    parser.add_argument('--warmup', type=int, default=2,
+                        help='seconds to skip at the start of each repetition')
+    parser.add_argument('--cooldown', type=int, default=1,
+                        help='seconds to skip at the end of each repetition')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative deviation from the median that still counts as steady state')
+    parser.add_argument('--statistic', type=str, default='median',
+                        choices=['median', 'max', 'p5', 'p25', 'p75', 'p95'],
+                        help='printed rate')
+    parser.add_argument('--output', type=str, default='max_rate.json',
+                        help='machine-readable file with all statistics')
+    parser.add_argument('--converged', metavar='TARGET_CI', type=float, default=None,
+                        help='print 1 if the 95%% confidence interval of the repetition medians '
+                             'relative to their mean is below TARGET_CI, else 0')
+    parser.add_argument('--tag', type=str, default='',
+                        help='suffix of the result files of one step of an in-process sweep, e.g. -64')
+    return parser.parse_args()
+
+
+def read_rates(filename, compare='PacketRate'):
+    # one row per second, rates in Mpps
+    with open(filename, 'r') as fh:
+        for row in csv.DictReader(fh, delimiter=','):
+            try:
+                yield float(row[compare]) * 1000000
+            except (KeyError, TypeError, ValueError):
+                continue
+
+
+def steady_state(rates, warmup, cooldown, tolerance):
+    rates = rates[warmup:len(rates) - cooldown] if len(rates) > warmup + cooldown else rates
+    if not rates:
+        return []
+    # cut the ramp up and down around the plateau
+    median = statistics.median(rates)
+    steady = [i for i, rate in enumerate(rates) if abs(rate - median) <= tolerance * median]
+    if not steady:
+        return rates
+    return rates[steady[0]:steady[-1] + 1]
+
+
+# two-sided 95% quantiles of the t distribution by degrees of freedom
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086]
+
+
+def relative_ci(values):
+    # half width of the 95% confidence interval of the mean, relative to the mean
+    if len(values) < 2 or statistics.mean(values) == 0:
+        return None
+    t = T_95[len(values) - 2] if len(values) - 1 <= len(T_95) else 1.96
+    return t * statistics.stdev(values) / len(values) ** 0.5 / statistics.mean(values)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def main():
+    args = argument_parser()
+
+    per_repetition = []
+    samples = []
+    for rep in range(1, repetitions + 1):
+        filename = 'throughput-max-rx{}.csv_{}'.format(args.tag, str(rep))
+        if not os.path.isfile(filename):
+            # fewer repetitions were measured
+            continue
+        steady = steady_state(list(read_rates(filename)), args.warmup, args.cooldown, args.tolerance)
+        if not steady:
+            continue
+        per_repetition.append({
+            'repetition': rep,
+            'seconds': len(steady),
+            'median': statistics.median(steady),
+            'max': max(steady),
+        })
+        samples += steady
+
+    result = {
+        'repetitions': per_repetition,
+        'relative_ci': relative_ci([rep['median'] for rep in per_repetition]),
+    }
+    if samples:
+        result.update({
+            'max': max(samples),
+            'median': statistics.median(samples),
+            'p5': percentile(samples, 5),
+            'p25': percentile(samples, 25),
+            'p75': percentile(samples, 75),
+            'p95': percentile(samples, 95),
+        })
+    with open(args.output, 'w') as fh:
+        json.dump(result, fh, indent=2)
+    if args.converged is not None:
+        converged = result['relative_ci'] is not None and result['relative_ci'] <= args.converged
+        print(1 if converged else 0)
+    else:
+        print(result.get(args.statistic, 0.0))
+
+
+if __name__ == '__main__':
+    main()
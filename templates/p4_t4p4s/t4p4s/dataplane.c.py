@@ -31,6 +31,8 @@ from utils.misc import addError, addWarning
 #[ extern void parse_packet(STDPARAMS);
 #[ extern void increase_counter(int counterid, int index);
 #[ extern void set_handle_packet_metadata(packet_descriptor_t* pd, uint32_t portid);
+@@ if table_qsbr @@#[ #define TABLE_QSBR_STRIDE 8
+#[ extern volatile uint64_t table_qsbr_counter[];@@ endif @@
 
 # note: 0 is for the special case where there are no tables
 max_key_length = max([t.key_length_bytes for t in hlir16.tables if hasattr(t, 'key')] + [0])
@@ -459,6 +461,11 @@ pkt_name_indent = " " * longest_hdr_name_len
 #{ {
 #[     int value32;
 #[     int res32;
+@@ if table_qsbr @@#[
+#[     // odd while the packet may reference table entries
+#[     volatile uint64_t* qsbr_counter = &table_qsbr_counter[rte_lcore_id() * TABLE_QSBR_STRIDE];
+#[     __atomic_store_n(qsbr_counter, *qsbr_counter + 1, __ATOMIC_RELAXED);
+#[     rte_smp_mb();@@ endif @@
 #[
 #[     reset_headers(SHORT_STDPARAMS_IN);
 #[     set_handle_packet_metadata(pd, portid);
@@ -474,4 +481,7 @@ pkt_name_indent = " " * longest_hdr_name_len
 #[     process_packet(STDPARAMS_IN);
 #[
 #[     emit_packet(STDPARAMS_IN);
+@@ if table_qsbr @@#[
+#[     // quiescent state, no table entry is referenced between packets
+#[     __atomic_store_n(qsbr_counter, *qsbr_counter + 1, __ATOMIC_RELEASE);@@ endif @@
 #} }
@@ -30,6 +30,124 @@ void change_replica(int socketid, int tid, int replica) {
     }
 }
 
+// Quiescent-state-based reclamation for single replica tables (NB_REPLICA == 1):
+// an lcore bumps its counter to odd when it starts a packet and to even when
+// the packet is done, after which it holds no reference to a table entry.
+// An update waits for the lcores that were inside a packet (odd) to finish
+// it; idle lcores and lcores that do not forward packets stay even and are
+// not waited for. A grace period is never cut short, lcores that take longer
+// than TABCHANGE_SLEEP_MICROS are reported and counted as stalls.
+#define TABLE_QSBR_STRIDE 8     // one cache line per lcore
+volatile uint64_t table_qsbr_counter[RTE_MAX_LCORE * TABLE_QSBR_STRIDE];
+
+static uint64_t table_qsbr_stalls = 0;
+
+void publish_ready_state(const char* name, uint64_t value);
+
+void table_qsbr_synchronize() {
+    uint64_t snapshot[RTE_MAX_LCORE];
+    rte_smp_mb();
+    for (unsigned lcore_id = 0; lcore_id < RTE_MAX_LCORE; lcore_id++) {
+        snapshot[lcore_id] = __atomic_load_n(&table_qsbr_counter[lcore_id * TABLE_QSBR_STRIDE], __ATOMIC_ACQUIRE);
+    }
+
+    uint64_t deadline = rte_get_timer_cycles() + rte_get_timer_hz() * TABCHANGE_SLEEP_MICROS / 1000000;
+    for (unsigned lcore_id = 0; lcore_id < RTE_MAX_LCORE; lcore_id++) {
+        if (rte_lcore_is_enabled(lcore_id) == 0) continue;
+        if (snapshot[lcore_id] % 2 == 0) continue;
+        bool stalled = false;
+        while (__atomic_load_n(&table_qsbr_counter[lcore_id * TABLE_QSBR_STRIDE], __ATOMIC_ACQUIRE) == snapshot[lcore_id]) {
+            if (!stalled && rte_get_timer_cycles() > deadline) {
+                stalled = true;
+                table_qsbr_stalls++;
+                fprintf(stderr, " !!!! Table grace period: lcore %u still in the same packet after %d us, waiting\n", lcore_id, TABCHANGE_SLEEP_MICROS);
+                publish_ready_state("table_qsbr_stalls", table_qsbr_stalls);
+            }
+            rte_pause();
+        }
+    }
+}
+
+// table changes so far, a swap (or grace period) sleeps once for all entries of a batch
+static uint64_t table_updates = 0;
+static uint64_t table_swaps = 0;
+
+#if NB_REPLICA == 1
+
+#include <rte_hash.h>
+#include "dpdk_tables.h"
+
+// entries replaced during a grace period, freed after it
+static void** table_retired = NULL;
+static uint64_t table_retired_count = 0;
+static uint64_t table_retired_size = 0;
+
+void table_retire(void* entry) {
+    if (entry == NULL) return;
+    if (table_retired_count == table_retired_size) {
+        table_retired_size = table_retired_size ? 2 * table_retired_size : 1024;
+        table_retired = realloc(table_retired, table_retired_size * sizeof(void*));
+    }
+    table_retired[table_retired_count++] = entry;
+}
+
+void table_reclaim() {
+    for (uint64_t idx = 0; idx < table_retired_count; idx++) {
+        rte_free(table_retired[idx]);
+    }
+    table_retired_count = 0;
+}
+
+// Entries replaced by a change, exact_add stores them next to the hash of the
+// table and overwrites them for an existing key. lpm_add and ternary_add keep
+// the entries they replace in the content of the table, as with replicas.
+void* exact_add_retire(lookup_table_t* t, uint8_t* key, uint8_t* value) {
+    if (t->entry.key_size == 0) return NULL;
+    extended_table_t* ext = (extended_table_t*)t->table;
+    int32_t index = rte_hash_lookup(ext->rte_table, key);
+    return index < 0 ? NULL : ext->content[index];
+}
+
+void* lpm_add_retire(lookup_table_t* t, uint8_t* key, uint8_t depth, uint8_t* value) {
+    return NULL;
+}
+
+void* ternary_add_retire(lookup_table_t* t, uint8_t* key, uint8_t* mask, uint8_t* value) {
+    return NULL;
+}
+
+void* table_set_default_action_retire(lookup_table_t* t, uint8_t* value) {
+    return t->default_val;
+}
+
+// single replica: entries are changed in place (the hashes are created with
+// RTE_HASH_EXTRA_FLAGS_RW_CONCURRENCY_LF), the entries they replace are freed
+// after a grace period
+#define CHANGE_TABLE(fun, par...) \
+{ \
+    table_retire(fun##_retire(state[socketid].tables[tableid][0], par)); \
+    fun(state[socketid].tables[tableid][0], par); \
+    table_qsbr_synchronize(); \
+    table_reclaim(); \
+    table_updates++; \
+    table_swaps++; \
+}
+
+// the batch needs a single grace period before replaced entries are reclaimed
+#define CHANGE_TABLE_SEQ(fun, par...) \
+{ \
+    for (uint64_t idx = 0; idx < nr_entries; idx++) { \
+        table_retire(fun##_retire(state[socketid].tables[tableid][0], par)); \
+        fun(state[socketid].tables[tableid][0], par); \
+    } \
+    table_qsbr_synchronize(); \
+    table_reclaim(); \
+    table_updates += nr_entries; \
+    table_swaps++; \
+}
+
+#else
+
 #define CHANGE_TABLE(fun, par...) \
 { \
     { \
@@ -38,6 +156,8 @@ void change_replica(int socketid, int tid, int replica) {
         fun(state[socketid].tables[tableid][next_replica], par); \
         change_replica(socketid, tableid, next_replica); \
         usleep(TABCHANGE_SLEEP_MICROS); \
+        table_updates++; \
+        table_swaps++; \
         for (int current_replica = 0; current_replica < NB_REPLICA; current_replica++) { \
             if (current_replica != next_replica) { \
                 fun(state[socketid].tables[tableid][current_replica], par); \
@@ -46,8 +166,69 @@ void change_replica(int socketid, int tid, int replica) {
     } \
 }
 
+// Applies nr_entries entries (par may use idx) to the inactive replica,
+// swaps once and sleeps once for the whole batch before updating the others.
+#define CHANGE_TABLE_SEQ(fun, par...) \
+{ \
+    { \
+        int current_replica = state[socketid].active_replica[tableid]; \
+        int next_replica = (current_replica+1)%NB_REPLICA; \
+        for (uint64_t idx = 0; idx < nr_entries; idx++) { \
+            fun(state[socketid].tables[tableid][next_replica], par); \
+        } \
+        change_replica(socketid, tableid, next_replica); \
+        usleep(TABCHANGE_SLEEP_MICROS); \
+        table_updates += nr_entries; \
+        table_swaps++; \
+        for (int current_replica = 0; current_replica < NB_REPLICA; current_replica++) { \
+            if (current_replica != next_replica) { \
+                for (uint64_t idx = 0; idx < nr_entries; idx++) { \
+                    fun(state[socketid].tables[tableid][current_replica], par); \
+                } \
+            } \
+        } \
+    } \
+}
+
+#endif
+
 extern char* get_entry_action_name(void* entry);
 
+#include <sys/stat.h>
+
+// readiness states polled by the measurement script, one number per file
+#define READY_DIR "/run/t4p4s_ready"
+
+static uint64_t ready_tables_filled = 0;
+static uint64_t ready_table_entries = 0;
+
+void publish_ready_state(const char* name, uint64_t value) {
+    char path[256];
+    char tmp[260];
+    snprintf(path, sizeof(path), READY_DIR "/%s", name);
+    snprintf(tmp, sizeof(tmp), "%s.tmp", path);
+
+    mkdir(READY_DIR, 0755);
+    FILE* file = fopen(tmp, "w");
+    if (file == NULL) return;
+    fprintf(file, "%" PRIu64 "\n", value);
+    fclose(file);
+    // the reader never sees a partially written value
+    rename(tmp, path);
+}
+
+void publish_table_filled(uint64_t nr_entries) {
+    ready_table_entries += nr_entries;
+    ready_tables_filled++;
+    publish_ready_state("table_entries", ready_table_entries);
+    publish_ready_state("tables_filled", ready_tables_filled);
+}
+
+void publish_table_changes() {
+    publish_ready_state("table_updates", table_updates);
+    publish_ready_state("table_swaps", table_swaps);
+}
+
 #ifdef T4P4S_DEBUG
 #define FORALL_PRINTOUT(txt1, txt2, b, should_print) \
     ++state[socketid].tables[tableid][0]->init_entry_count; \
@@ -88,50 +269,167 @@ extern char* get_entry_action_name(void* entry);
             b \
         }
 
-#define CHANGE_TABLE_SEQ(fun, par...) \
-{ \
-    { \
-        int current_replica = state[socketid].active_replica[tableid]; \
-        int next_replica = (current_replica+1)%NB_REPLICA; \
-        for (uint64_t idx = 0; idx < nr_entries; idx++) { \
-            fun(state[socketid].tables[tableid][next_replica], par); \
-        } \
-        change_replica(socketid, tableid, next_replica); \
-        usleep(TABCHANGE_SLEEP_MICROS); \
-        for (int current_replica = 0; current_replica < NB_REPLICA; current_replica++) { \
-            if (current_replica != next_replica) { \
-                for (uint64_t idx = 0; idx < nr_entries; idx++) { \
-                    fun(state[socketid].tables[tableid][current_replica], par); \
-                } \
-            } \
-        } \
-    } \
+//=============================================================================
+// Bulk loading of table entries from the binary file generated by the framework
+
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <time.h>
+
+#ifndef BULK_FILE
+#define BULK_FILE "/root/t4p4s/t4p4s/table_entries.bin"
+#endif
+#define BULK_MAGIC "P4BL"
+#define BULK_VERSION 1
+#define BULK_BATCH 65536
+
+enum { BULK_EXACT = 0, BULK_LPM = 1, BULK_TERNARY = 2 };
+
+typedef struct __attribute__((packed)) bulk_header_s {
+    char     magic[4];
+    uint16_t version;
+    uint16_t nr_tables;
+} bulk_header_t;
+
+typedef struct __attribute__((packed)) bulk_table_s {
+    uint32_t table_id;
+    uint8_t  match_type;
+    uint8_t  key_size;
+    uint16_t record_size;
+    uint64_t nr_entries;
+    uint64_t offset;
+} bulk_table_t;
+
+// Inserts the entries of table `tableid` from the bulk-load file in batches of
+// BULK_BATCH, every entry with the action `value`. Returns the number of
+// inserted entries, 0 without a file or records of this table and match type.
+uint64_t bulk_load_table(int tableid, int match_type, uint8_t* value)
+{
+    int fd = open(BULK_FILE, O_RDONLY);
+    if (fd < 0) return 0;
+    struct stat st;
+    fstat(fd, &st);
+    uint8_t* data = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+    close(fd);
+    if (data == MAP_FAILED) return 0;
+
+    bulk_header_t* header = (bulk_header_t*)data;
+    bulk_table_t* table = NULL;
+    if (memcmp(header->magic, BULK_MAGIC, 4) == 0 && header->version == BULK_VERSION) {
+        bulk_table_t* tables = (bulk_table_t*)(data + sizeof(bulk_header_t));
+        for (int i = 0; i < header->nr_tables; i++) {
+            if (tables[i].table_id == tableid && tables[i].match_type == match_type) table = &tables[i];
+        }
+    }
+    if (table == NULL || table->key_size != state[0].tables[tableid][0]->entry.key_size) {
+        munmap(data, st.st_size);
+        return 0;
+    }
+
+    struct timespec start, end;
+    clock_gettime(CLOCK_MONOTONIC, &start);
+
+    uint16_t record_size = table->record_size;
+    uint8_t key_size = table->key_size;
+    madvise(data + table->offset, table->nr_entries * record_size, MADV_SEQUENTIAL);
+    // keys are read in place from the mapped records
+    for (uint64_t first = 0; first < table->nr_entries; first += BULK_BATCH) {
+        uint8_t* records = data + table->offset + first * record_size;
+        uint64_t nr_entries = table->nr_entries - first < BULK_BATCH ? table->nr_entries - first : BULK_BATCH;
+        switch (match_type) {
+            case BULK_EXACT:
+                FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(exact), CHANGE_TABLE_SEQ(exact_add, records + idx * record_size, value), false)
+                break;
+            case BULK_LPM:
+                FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(lpm), CHANGE_TABLE_SEQ(lpm_add, records + idx * record_size, records[idx * record_size + key_size], value), false)
+                break;
+            case BULK_TERNARY:
+                FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(ternary), CHANGE_TABLE_SEQ(ternary_add, records + idx * record_size, records + idx * record_size + key_size, value), false)
+                break;
+        }
+    }
+
+    clock_gettime(CLOCK_MONOTONIC, &end);
+    uint64_t load_us = (end.tv_sec - start.tv_sec) * 1000000 + (end.tv_nsec - start.tv_nsec) / 1000;
+    uint64_t nr_entries = table->nr_entries;
+    munmap(data, st.st_size);
+
+    printf("Loaded %" PRIu64 " entries into table %d in %" PRIu64 " us\n", nr_entries, tableid, load_us);
+    char name[64];
+    snprintf(name, sizeof(name), "table_entries_%d", tableid);
+    publish_ready_state(name, nr_entries);
+    snprintf(name, sizeof(name), "table_load_us_%d", tableid);
+    publish_ready_state(name, load_us);
+    return nr_entries;
 }
 
+// The control plane fills a table with *_add_promote_multiple, the entries of
+// the bulk-load file take the place of its keys when the file has the table.
 void exact_add_promote_multiple(int tableid, uint8_t** keys, uint8_t* value, uint64_t nr_entries, bool should_print)
 {
-	FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(exact), CHANGE_TABLE_SEQ(exact_add, keys[idx], value), should_print)
+    uint64_t loaded = bulk_load_table(tableid, BULK_EXACT, value);
+    if (loaded == 0) {
+        FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(exact), CHANGE_TABLE_SEQ(exact_add, keys[idx], value), should_print)
+    }
+    publish_table_filled(loaded ? loaded : nr_entries);
+    publish_table_changes();
 }
 
 void exact_add_promote(int tableid, uint8_t* key, uint8_t* value, bool should_print) {
     FORALLNUMANODES(Add, "/" T4LIT(exact), CHANGE_TABLE(exact_add, key, value), should_print)
+    publish_table_changes();
 }
 void lpm_add_promote(int tableid, uint8_t* key, uint8_t depth, uint8_t* value, bool should_print) {
     FORALLNUMANODES(Add, "/" T4LIT(LPM), CHANGE_TABLE(lpm_add, key, depth, value), should_print)
+    publish_table_changes();
 }
 void ternary_add_promote(int tableid, uint8_t* key, uint8_t* mask, uint8_t* value, bool should_print) {
     FORALLNUMANODES(Add, "/" T4LIT(ternary), CHANGE_TABLE(ternary_add, key, mask, value), should_print)
+    publish_table_changes();
 }
 void table_setdefault_promote(int tableid, uint8_t* value) {
     FORALLNUMANODES_NOKEY(Set default, "on table", CHANGE_TABLE(table_set_default_action, value))
+    publish_table_changes();
 }
 
 void ternary_add_promote_multiple(int tableid, uint8_t** keys, uint8_t** masks, uint8_t* value, uint64_t nr_entries)
 {
-    FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(ternary), CHANGE_TABLE_SEQ(ternary_add, keys[idx], masks[idx], value), should_print)
+    uint64_t loaded = bulk_load_table(tableid, BULK_TERNARY, value);
+    if (loaded == 0) {
+        FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(ternary), CHANGE_TABLE_SEQ(ternary_add, keys[idx], masks[idx], value), should_print)
+    }
+    publish_table_filled(loaded ? loaded : nr_entries);
+    publish_table_changes();
 }
 
 void lpm_add_promote_multiple(int tableid, uint8_t** keys, uint8_t* depths, uint8_t* value, uint64_t nr_entries)
 {
-    FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(lpm), CHANGE_TABLE_SEQ(lpm_add, keys[idx], depths[idx], value), should_print)
+    uint64_t loaded = bulk_load_table(tableid, BULK_LPM, value);
+    if (loaded == 0) {
+        FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(lpm), CHANGE_TABLE_SEQ(lpm_add, keys[idx], depths[idx], value), should_print)
+    }
+    publish_table_filled(loaded ? loaded : nr_entries);
+    publish_table_changes();
+}
+
+// Bulk updates with an action per entry: the nr_entries entries share one swap
+// (and one TABCHANGE_SLEEP_MICROS) instead of one per entry, as with the single
+// entry adds above. The entries are in all replicas when the call returns.
+void exact_add_promote_batch(int tableid, uint8_t** keys, uint8_t** values, uint64_t nr_entries, bool should_print)
+{
+    FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(exact), CHANGE_TABLE_SEQ(exact_add, keys[idx], values[idx]), should_print)
+    publish_table_changes();
+}
+
+void lpm_add_promote_batch(int tableid, uint8_t** keys, uint8_t* depths, uint8_t** values, uint64_t nr_entries, bool should_print)
+{
+    FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(lpm), CHANGE_TABLE_SEQ(lpm_add, keys[idx], depths[idx], values[idx]), should_print)
+    publish_table_changes();
+}
+
+void ternary_add_promote_batch(int tableid, uint8_t** keys, uint8_t** masks, uint8_t** values, uint64_t nr_entries, bool should_print)
+{
+    FORALLNUMANODES_MULTIPLE(Add, "/" T4LIT(ternary), CHANGE_TABLE_SEQ(ternary_add, keys[idx], masks[idx], values[idx]), should_print)
+    publish_table_changes();
 }
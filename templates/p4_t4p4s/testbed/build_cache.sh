@@ -0,0 +1,73 @@
+#!/bin/bash
+
+# cache of t4p4s builds on the DuT
+#   build_cache.sh key PROGRAM          print the key of the current sources
+#   build_cache.sh restore PROGRAM KEY  restore a cached build, fails on a miss
+#   build_cache.sh store PROGRAM KEY    store the current build
+# the key covers program, controller, control plane, table headers,
+# replicas and hash flags, build options and the pinned commits of t4p4s and its dependencies
+
+CACHE_DIR=/root/t4p4s_build_cache
+MAX_ENTRIES={{ max_entries }}
+T4P4S=/root/t4p4s/t4p4s
+CONTROLLER=src/hardware_dep/shared/ctrl_plane/dpdk_l2fwd_controller
+
+COMMAND=$1
+PROGRAM=$2
+KEY=$3
+
+cd ${T4P4S}
+mkdir -p ${CACHE_DIR}
+
+case ${COMMAND} in
+key)
+	{
+		echo "{% for name, commit in commits.items() %}{{ name }}={{ commit }} {% endfor %}"
+		cat examples/${PROGRAM}.p4 \
+			${CONTROLLER}.c \
+			src/hardware_indep/controlplane.c.py \
+			src/hardware_indep/dataplane.c.py \
+			src/hardware_dep/dpdk/includes/dpdk_tables.h \
+			src/hardware_dep/dpdk/data_plane/dpdk_lib_change_tables.c \
+			$(grep -rl "^#define NB_REPLICA" src/hardware_dep/dpdk) \
+			$(grep -rl "struct rte_hash_parameters" src/hardware_dep/dpdk) \
+			opts_dpdk.cfg examples.cfg 2>/dev/null
+	} | sha256sum | cut -d ' ' -f 1
+	;;
+restore)
+	# current build is already the requested one
+	if [[ -f build/${PROGRAM}/.build_cache_key && $(cat build/${PROGRAM}/.build_cache_key) == "${KEY}" ]]; then
+		exit 0
+	fi
+	if [[ ! -d ${CACHE_DIR}/${KEY} ]]; then
+		exit 1
+	fi
+	rm -rf build/${PROGRAM}
+	mkdir -p build
+	cp -a ${CACHE_DIR}/${KEY}/build build/${PROGRAM}
+	if [[ -f ${CACHE_DIR}/${KEY}/controller ]]; then
+		cp -a ${CACHE_DIR}/${KEY}/controller ${CONTROLLER}
+	fi
+	# mark as recently used
+	touch ${CACHE_DIR}/${KEY}
+	;;
+store)
+	rm -rf ${CACHE_DIR}/${KEY}.tmp
+	mkdir -p ${CACHE_DIR}/${KEY}.tmp
+	echo ${KEY} > build/${PROGRAM}/.build_cache_key
+	cp -a build/${PROGRAM} ${CACHE_DIR}/${KEY}.tmp/build
+	if [[ -f ${CONTROLLER} ]]; then
+		cp -a ${CONTROLLER} ${CACHE_DIR}/${KEY}.tmp/controller
+	fi
+	rm -rf ${CACHE_DIR}/${KEY}
+	mv ${CACHE_DIR}/${KEY}.tmp ${CACHE_DIR}/${KEY}
+	# evict least recently used builds, not the ones still being stored
+	ls -1t ${CACHE_DIR} | grep -v '\.tmp$' | tail -n +$((MAX_ENTRIES + 1)) | while read entry; do
+		rm -rf ${CACHE_DIR}/${entry}
+	done
+	;;
+*)
+	echo "Usage: build_cache.sh key|restore|store PROGRAM [KEY]"
+	exit 2
+	;;
+esac
@@ -17,6 +17,11 @@ PERF_STAT_RUNS=$(pos_get_variable perf/runs)
 PERF_STAT_EVENTS=$(pos_get_variable perf/events)
 DURATION_MAX_LOAD=$(pos_get_variable duration/max_load --from-global)
 PERF_STAT_DURATION=`python -c "print(int((${DURATION_MAX_LOAD} - 2)/${PERF_STAT_RUNS}))"`
+{% if sweep_packet_size %}
+# the loadgen steps through the packet sizes in one run, settling before each step
+PACKET_SIZES=$(pos_get_variable sweep/packet_sizes --from-global)
+SWEEP_SETTLE=$(pos_get_variable sweep/settle --from-global)
+{% endif %}
 
 {% if scale_frequency %}
 # set cpu frequency
@@ -35,19 +40,89 @@ cd /root/t4p4s/t4p4s/
 INDEX=$(pos_get_variable --from-loop {{ multiple_programs }})
 cp examples/synthetic_${INDEX}.p4 examples/synthetic.p4
 cp src/hardware_dep/shared/ctrl_plane/dpdk_l2fwd_controller_${INDEX}.c src/hardware_dep/shared/ctrl_plane/dpdk_l2fwd_controller.c
+{% if update_tables %}
+cp src/hardware_dep/dpdk/includes/dpdk_tables_${INDEX}.h src/hardware_dep/dpdk/includes/dpdk_tables.h
+{% endif %}
+{% if bulk_tables %}
+ln -sf table_entries_${INDEX}.bin table_entries.bin
+{% endif %}
 {% endif %}
 {% if update_controlplane %}
 cp src/hardware_indep/controlplane_${INDEX}.c.py src/hardware_indep/controlplane.c.py
 {% endif %}
+{% if not bulk_tables %}
+# the control plane loads a bulk-load file whenever there is one
+rm -f table_entries.bin
+{% endif %}
+
+{% if table_qsbr %}
+# a single table replica per socket, updated in place (rcu table mode)
+T4P4S_PATCHED=$(grep -rl "^#define NB_REPLICA" src/hardware_dep/dpdk)
+sed -i "s/^#define NB_REPLICA .*/#define NB_REPLICA 1/" ${T4P4S_PATCHED}
+# readers and the writer access the hashes concurrently
+HASH_SOURCES=$(grep -rl "struct rte_hash_parameters [A-Za-z_]* = {" src/hardware_dep/dpdk)
+if [[ -z ${HASH_SOURCES} ]]; then
+	echo "rcu table mode: cannot create the t4p4s hashes with RTE_HASH_EXTRA_FLAGS_RW_CONCURRENCY_LF"
+	exit 1
+fi
+sed -i "s/\(struct rte_hash_parameters [A-Za-z_]* = {\)/\1 .extra_flag = RTE_HASH_EXTRA_FLAGS_RW_CONCURRENCY_LF,/" ${HASH_SOURCES}
+T4P4S_PATCHED="${T4P4S_PATCHED} ${HASH_SOURCES}"
+{% endif %}
+
+# readiness states published by t4p4s, the dataplane and the controller
+READY_DIR=/run/t4p4s_ready
+READY_TIMEOUT=60
+FILL_TIMEOUT=600
+# wait_state STATE MINIMUM TIMEOUT, fails after the timeout
+wait_state() {
+	local start=${SECONDS}
+	while (( SECONDS - start <= $3 )); do
+		local value=0
+		case $1 in
+		compiled) value=$(pos_get_variable tapas_started) ;;
+		ports_up) value=$(grep -c "Link Up" ${T4P4S_LOG}) ;;
+		*) value=$(cat ${READY_DIR}/$1 2>/dev/null) ;;
+		esac
+		if [[ ${value:-0} -ge $2 ]]; then
+			echo "$1: ${value} after $(( SECONDS - start )) s"
+			return 0
+		fi
+		sleep 0.2
+	done
+	echo "$1: not reached after $3 s"
+	return 1
+}
+
+# t4p4s build cache, cores and ports are runtime options and not part of the key
+BUILD_CACHE=/root/t4p4s_build_cache.sh
+BUILD_KEY=$(bash ${BUILD_CACHE} key ${P4_PROGRAM})
+BUILD_CACHE_LOG=build_cache.csv
+echo "repetition,key,result" > ${BUILD_CACHE_LOG}
+# repetitions the dut did not start up for are skipped by the loadgen
+STARTUP_LOG=startup.csv
+echo "repetition,state" > ${STARTUP_LOG}
 
 for (( REPETITION=1; REPETITION<=$REPEAT_MAX_LOAD; REPETITION++ ))
 do
 	# clear startup state
 	pos_set_variable tapas_started 0
-	# start t4p4s
-	pos_run tapas_${REPETITION} --loop -- ./t4p4s.sh :${P4_PROGRAM} cores=${CORES} ports=2x${CORES}
+	rm -rf ${READY_DIR}
+	# a repetition without perf stat recording must not upload the files of the last one
+	rm -f /root/perf_stat.csv_*
+	T4P4S_LOG=/tmp/t4p4s_${REPETITION}.log
+	# only run a cached build, otherwise all phases (p4, c, run)
+	T4P4S_PHASES=""
+	BUILD_CACHE_RESULT=miss
+	if bash ${BUILD_CACHE} restore ${P4_PROGRAM} ${BUILD_KEY}; then
+		echo "using cached build ${BUILD_KEY}"
+		T4P4S_PHASES="run"
+		BUILD_CACHE_RESULT=hit
+	fi
+	echo "${REPETITION},${BUILD_KEY},${BUILD_CACHE_RESULT}" >> ${BUILD_CACHE_LOG}
+	# start t4p4s, its output tells when the ports are up
+	pos_run tapas_${REPETITION} --loop -- bash -c "./t4p4s.sh :${P4_PROGRAM} ${T4P4S_PHASES} cores=${CORES} ports={{ nb_ports }}x${CORES} 2>&1 | tee ${T4P4S_LOG}"
 	
-	# wait for startup
+	# wait for compiling end
 	MAX_WAIT=15
 	{% if increase_max_wait %}
 	MAX_WAIT=$INDEX
@@ -55,32 +130,69 @@ do
 	if [[ $MAX_WAIT -lt 15 ]]; then
 		MAX_WAIT=15
 	fi
-	for ((i = 0 ; i <= $MAX_WAIT ; i++));
-	do
-	        if [[ $(pos_get_variable tapas_started) == '1' ]]; then
-	                echo 'finished compiling'
-	                break
-	        fi
-	        echo "waiting for compiling end"
-	        sleep 1
-	done
+	if wait_state compiled 1 ${MAX_WAIT}; then
+		# only cache successful builds
+		if [[ ${BUILD_CACHE_RESULT} == miss ]]; then
+			bash ${BUILD_CACHE} store ${P4_PROGRAM} ${BUILD_KEY}
+		fi
+	fi
 
-	# wait some more time until app started
-	sleep 5
-	{% if increase_wait %}
-	# wait per table entry
-	CONTROLLER_STARTUP=`python -c "print(${INDEX} / 1000000)"`
-	echo "waiting an additional ${CONTROLLER_STARTUP} seconds"
-	sleep ${CONTROLLER_STARTUP}
+	# wait until the app started instead of fixed sleeps
+	STARTUP=ok
+	wait_state ports_up {{ nb_ports }} ${READY_TIMEOUT} || STARTUP=failed
+	{% if wait_tables %}
+	# tables filled by the control plane, with the number of entries
+	if [[ ${STARTUP} == ok ]]; then
+		wait_state tables_filled {{ expected_tables }} ${FILL_TIMEOUT} || STARTUP=failed
+		echo "table entries: $(cat ${READY_DIR}/table_entries 2>/dev/null)"
+	fi
+	{% if bulk_tables %}
+	# load time per table of the bulk-load file
+	echo "table,entries,load_us" > table_load_times.csv_${REPETITION}
+	for file in ${READY_DIR}/table_load_us_*; do
+		[[ -f ${file} ]] || continue
+		TABLE=${file##*_}
+		echo "${TABLE},$(cat ${READY_DIR}/table_entries_${TABLE}),$(cat ${file})" >> table_load_times.csv_${REPETITION}
+	done
+	pos_upload --loop table_load_times.csv_${REPETITION}
 	{% endif %}
+	{% endif %}
+	echo "${REPETITION},${STARTUP}" >> ${STARTUP_LOG}
+	# the loadgen reads the state after the sync
+	pos_set_variable --as-global dut_startup ${STARTUP}
 	
 	pos_sync --loop --tag dut_startup_${REPETITION}_completed
 	# wait for moongen to start
 	pos_sync --loop --tag max_load_measurement_${REPETITION}_started
 	# start perf stat recording
-	sleep 1
-	pos_run perf_stat_${REPETITION} --upload --loop bash /root/run_perf_stat_${CORES}.sh $PERF_STAT_RUNS $PERF_STAT_EVENTS $PERF_STAT_DURATION
+	if [[ ${STARTUP} == ok ]]; then
+{% if sweep_packet_size %}
+		# one recording per packet size step of the loadgen
+		for SIZE in ${PACKET_SIZES}; do
+			sleep 1
+			pos_run perf_stat_${REPETITION}_${SIZE} --upload --loop bash /root/run_perf_stat_${CORES}.sh $PERF_STAT_RUNS "$PERF_STAT_EVENTS" $PERF_STAT_DURATION /root/perf_stat.csv_${REPETITION}_${SIZE}
+			sleep $(( DURATION_MAX_LOAD - 1 + SWEEP_SETTLE ))
+		done
+{% else %}
+		sleep 1
+		pos_run perf_stat_${REPETITION} --upload --loop bash /root/run_perf_stat_${CORES}.sh $PERF_STAT_RUNS "$PERF_STAT_EVENTS" $PERF_STAT_DURATION /root/perf_stat.csv_${REPETITION}
+{% endif %}
+	fi
 	pos_sync --loop --tag max_load_measurement_${REPETITION}_finished
+	# table updates and the swaps (grace periods for single replica tables) they needed
+	echo "updates,swaps,stalls" > table_changes.csv_${REPETITION}
+	echo "$(cat ${READY_DIR}/table_updates 2>/dev/null),$(cat ${READY_DIR}/table_swaps 2>/dev/null),$(cat ${READY_DIR}/table_qsbr_stalls 2>/dev/null || echo 0)" >> table_changes.csv_${REPETITION}
+	pos_upload --loop table_changes.csv_${REPETITION}
+	# perf stat ends before the loadgen, counts with running and multiplexed flag per run
+	for file in /root/perf_stat.csv_${REPETITION} /root/perf_stat.csv_${REPETITION}_*; do
+		[[ -f ${file} ]] && pos_upload --loop ${file}
+	done
+	LAST_REPETITION=${REPETITION}
+
+	# the loadgen stops early once the repetitions converged
+	if [[ $(pos_get_variable --from-global max_load_stop) == '1' ]]; then
+		break
+	fi
 
 	# stop if we restart afterwards
 	if [ "$REPETITION" -ne "$REPEAT_MAX_LOAD" ]
@@ -94,8 +206,18 @@ done
 # wait for measurement to finish
 pos_sync --loop --tag loadgen_measurement_finished
 
+# report build cache hits and misses of this loop
+echo "build cache: $(grep -c ',hit$' ${BUILD_CACHE_LOG}) hits, $(grep -c ',miss$' ${BUILD_CACHE_LOG}) misses"
+pos_upload --loop ${BUILD_CACHE_LOG}
+echo "dut startup: $(grep -c ',failed$' ${STARTUP_LOG}) of $(( $(wc -l < ${STARTUP_LOG}) - 1 )) repetitions failed"
+pos_upload --loop ${STARTUP_LOG}
+
 # finally stop t4p4s
-pos_kill tapas_${REPEAT_MAX_LOAD} --loop
+pos_kill tapas_${LAST_REPETITION} --loop
 killall ${P4_PROGRAM}
 pkill -f "./src/hardware_dep/shared/ctrl_plane/dpdk_l2fwd_controller"
 
+{% if table_qsbr %}
+# leave the t4p4s sources as checked out
+git checkout -- ${T4P4S_PATCHED}
+{% endif %}
@@ -3,9 +3,22 @@
 RUNS=$1
 EVENTS=$2
 DURATION=$3
+SUMMARY=${4:-/root/perf_stat.csv}
 
+# event groups fitting the counters of the cpu, separated by semicolons
+IFS=';' read -r -a EVENT_GROUPS <<< "${EVENTS}"
+NUMBER_GROUPS=$(echo "${EVENTS}" | tr ';' '\n' | wc -l)
+
+echo "run,group,value,event,running_percent,multiplexed" > ${SUMMARY}
 for i in $(seq 1 $RUNS) ;
 do
+        # rotate the groups across the runs
+        GROUP=$(( (i - 1) % NUMBER_GROUPS ))
         echo Run $i ;
-        perf stat -C {{ cores }} -x, -e ${EVENTS} sleep ${DURATION} ;
+        echo "# group ${GROUP}"
+        perf stat -C {{ cores }} -x, -o /tmp/perf_stat_run.csv -e ${EVENT_GROUPS[$GROUP]} sleep ${DURATION} ;
+        # without the '# started on' header of the output file, as perf stat writes to stderr
+        grep -v -e '^#' -e '^$' /tmp/perf_stat_run.csv >&2
+        # perf scales counts that ran less than 100% of the time they were enabled
+        awk -F, -v run=$i -v group=$GROUP '!/^#/ && NF >= 5 { print run "," group "," $1 "," $3 "," $5 "," ($5 != "" && $5 + 0 < 100) }' /tmp/perf_stat_run.csv >> ${SUMMARY}
 done
@@ -0,0 +1,27 @@
+#!/bin/bash
+
+# copies only the files that changed during the last generation of this
+# experiment to already allocated and set up hosts
+
+set -xe
+
+# determine experiment root folder
+ROOT=$(dirname $(realpath $0))/..
+
+if test "$#" -ne 2; then
+	echo "Usage: redeploy.sh loadgen-experiment-node dut-experiment-node"
+	exit
+fi
+
+LG=$1
+DUT=$2
+
+echo "reload changed variables files"
+{% for var in variables %}pos allocations variables "{{ var.device }}" ${ROOT}/{{ var.from }}{% if var.option %} {{ var.option }}{% endif %}
+{% endfor %}
+
+echo "copying changed files"
+{% for cp in copy %}{ pos nodes copy "{{ cp.device }}" ${ROOT}/{{ cp.from }} --dest {{ cp.dest }}; } &{% if loop.index % 10 == 9 %}
+wait{% endif %}
+{% endfor %}
+wait